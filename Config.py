@@ -1,18 +1,165 @@
 import json
+import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import urlparse
 import praw
+import prawcore
+from games.Metrics import registry
+
+# fname -> (mtime, parsed config), so long-running processes only parse a config once
+parsed_configs = {}
 
 def get_json_data(fname):
+	mtime = os.path.getmtime(fname)
+	if fname in parsed_configs and parsed_configs[fname][0] == mtime:
+		return parsed_configs[fname][1]
 	with open(fname) as json_data:
 		data = json.load(json_data)
+	parsed_configs[fname] = (mtime, data)
 	return data
 
+# Don't start a run on an access token that is about to expire
+TOKEN_MARGIN_SECONDS = 120
+token_lock = threading.Lock()
+
+def load_token(fname, refresh_token):
+	try:
+		with open(fname) as token_file:
+			token = json.load(token_file)
+	except FileNotFoundError:
+		return None
+	except:
+		logging.exception('Ignoring unreadable token file %s', fname)
+		return None
+	# A token minted for a different refresh token belongs to some other account or app
+	if token.get('refresh_token') != refresh_token or token['expires_at'] - time.time() < TOKEN_MARGIN_SECONDS:
+		return None
+	return token
+
+def expire_token(authorizer):
+	# prime_authorizer sets both expiry fields, and prawcore reads its own one directly, so zero them
+	# rather than deleting them: a failed refresh then leaves an expired token instead of a broken
+	# authorizer, and after a successful one only the field this prawcore version uses is non-zero
+	authorizer._expiration_timestamp = 0
+	authorizer._expiration_timestamp_ns = 0
+
+def save_token(fname, authorizer, refresh_token):
+	if vars(authorizer).get('_expiration_timestamp_ns', 0) > 0:
+		# prawcore 3+ keeps the expiry on the monotonic clock
+		expires_at = time.time() + (authorizer._expiration_timestamp_ns - time.monotonic_ns()) / 1e9
+	else:
+		expires_at = authorizer._expiration_timestamp
+	token = {'access_token': authorizer.access_token,
+		'scopes': sorted(authorizer.scopes),
+		'expires_at': expires_at,
+		'refresh_token': refresh_token}
+	with token_lock:
+		try:
+			# Write then rename, so a concurrent run never reads half a token
+			with open(fname + '.tmp', 'w') as token_file:
+				os.chmod(fname + '.tmp', 0o600)
+				json.dump(token, token_file)
+			os.replace(fname + '.tmp', fname)
+		except:
+			logging.exception('Failed to save access token to %s', fname)
+
+def prime_authorizer(reddit, token_fname, refresh_token):
+	"""
+	Load a saved access token into a praw/asyncpraw client so it can skip the token refresh,
+	and save every new token the client fetches from now on
+	"""
+
+	try:
+		authorizer = reddit._core._authorizer
+	except AttributeError:
+		logging.warning('Unrecognised praw internals, not reusing access tokens')
+		return
+	authorizer._pre_refresh_callback = expire_token
+	authorizer._post_refresh_callback = lambda authorizer: save_token(token_fname, authorizer, refresh_token)
+	token = load_token(token_fname, refresh_token)
+	if token is None:
+		return
+	remaining = token['expires_at'] - time.time()
+	authorizer.access_token = token['access_token']
+	authorizer.scopes = set(token['scopes'])
+	# Older prawcore compares the expiry with wall-clock time, newer with a monotonic clock
+	authorizer._expiration_timestamp = token['expires_at']
+	authorizer._expiration_timestamp_ns = time.monotonic_ns() + int(remaining * 1e9)
+
+user_agent = 'Mafia Game Bot v0.2 (by u/BourbonInExile)'
+
+# Subreddit, user and thread names in API paths are collapsed so each endpoint is one series
+path_names = re.compile(r'/(r|u|user|comments|by_id)/[^/]+')
+
+rate_limit_gauges = [('x-ratelimit-remaining', 'hww_reddit_ratelimit_remaining'),
+	('x-ratelimit-used', 'hww_reddit_ratelimit_used'),
+	('x-ratelimit-reset', 'hww_reddit_ratelimit_reset_seconds')]
+
+def request_labels(args, kwargs):
+	method = args[0] if len(args) > 0 else kwargs.get('method', '')
+	url = args[1] if len(args) > 1 else kwargs.get('url', '')
+	return {'method': method.upper(), 'endpoint': path_names.sub(r'/\1/:name', urlparse(url).path)}
+
+def record_request(labels, status, seconds, headers):
+	registry.inc('hww_reddit_requests_total', status=status, **labels)
+	registry.observe('hww_reddit_request_seconds', seconds, **labels)
+	for header, gauge in rate_limit_gauges:
+		if header in headers:
+			registry.set(gauge, float(headers[header]))
+
+class InstrumentedRequestor(prawcore.Requestor):
+	"""
+	prawcore Requestor that records every Reddit API call and the rate-limit headers
+	"""
+
+	def request(self, *args, **kwargs):
+		labels = request_labels(args, kwargs)
+		start = time.perf_counter()
+		try:
+			response = super().request(*args, **kwargs)
+		except:
+			registry.inc('hww_reddit_request_errors_total', **labels)
+			raise
+		record_request(labels, response.status_code, time.perf_counter() - start, response.headers)
+		return response
+
 class Config():
 	def __init__(self, config_file_name):
 		self.fname = "config/" + config_file_name.lower() + ".json"
+		self.token_fname = "config/" + config_file_name.lower() + ".token.json"
 		self.raw_config = get_json_data(self.fname)
 		self.client_id = self.raw_config['client_id']
 		self.client_secret = self.raw_config['client_secret']
 		self.bot_username = self.raw_config['bot_username']
 		self.bot_password = self.raw_config['bot_password']
 		self.refresh_token = self.raw_config['refresh_token']
-		self.reddit_object = praw.Reddit(client_id=self.client_id, client_secret=self.client_secret, user_agent='Mafia Game Bot v0.2 (by u/BourbonInExile)', refresh_token=self.refresh_token)
+		self.reddit_object = praw.Reddit(client_id=self.client_id, client_secret=self.client_secret, user_agent=user_agent, refresh_token=self.refresh_token,
+			requestor_class=InstrumentedRequestor)
+		prime_authorizer(self.reddit_object, self.token_fname, self.refresh_token)
+
+	def async_reddit_object(self):
+		# asyncpraw is only needed for periodical.py --async
+		import asyncpraw
+		import asyncprawcore
+		from contextlib import asynccontextmanager
+
+		class AsyncInstrumentedRequestor(asyncprawcore.Requestor):
+			@asynccontextmanager
+			async def request(self, *args, **kwargs):
+				labels = request_labels(args, kwargs)
+				start = time.perf_counter()
+				try:
+					async with super().request(*args, **kwargs) as response:
+						record_request(labels, response.status, time.perf_counter() - start, response.headers)
+						yield response
+				except asyncprawcore.RequestException:
+					registry.inc('hww_reddit_request_errors_total', **labels)
+					raise
+
+		async_reddit = asyncpraw.Reddit(client_id=self.client_id, client_secret=self.client_secret, user_agent=user_agent, refresh_token=self.refresh_token,
+			requestor_class=AsyncInstrumentedRequestor)
+		prime_authorizer(async_reddit, self.token_fname, self.refresh_token)
+		return async_reddit
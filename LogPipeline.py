@@ -0,0 +1,123 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+LOG_PREFIX = 'HWWGameBot'
+
+# Sent with every state server request made during a tick, so both processes' records can be joined up
+TICK_HEADER = 'X-Tick-Id'
+
+# {'tick_id', 'game_id'} of the tick the current thread or task is running, if any
+current_tick = contextvars.ContextVar('current_tick', default=None)
+
+listener = None
+configured = False
+
+class TickQueueHandler(QueueHandler):
+    """
+    Hands records to the background writer, tagged with the current tick
+
+    The message is rendered here, since its arguments may have changed by the time the
+    writer gets to it; records below the logger's level never get this far.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        tick = current_tick.get()
+        record.tick_id = None if tick is None else tick['tick_id']
+        record.game_id = None if tick is None else tick['game_id']
+        return record
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line
+    """
+
+    def __init__(self, process_name):
+        logging.Formatter.__init__(self)
+        self.process_name = process_name
+
+    def format(self, record):
+        entry = {'time': datetime.fromtimestamp(record.created, timezone.utc).astimezone().isoformat(sep='T', timespec='milliseconds'),
+                 'level': record.levelname,
+                 'process': self.process_name,
+                 'pid': record.process,
+                 'thread': record.threadName,
+                 'module': record.module,
+                 'function': record.funcName,
+                 'message': record.getMessage()}
+        if getattr(record, 'tick_id', None) is not None:
+            entry['tick_id'] = record.tick_id
+            entry['game_id'] = record.game_id
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+def log_fname(process_name, per_process):
+    if per_process:
+        return '{}-{}-{}.log'.format(LOG_PREFIX, process_name, os.getpid())
+    return '{}-{}.log'.format(LOG_PREFIX, process_name)
+
+def start_listener(process_name, per_process):
+    global listener
+    log_queue = queue.SimpleQueue()
+    file_handler = TimedRotatingFileHandler(log_fname(process_name, per_process), when='W0', backupCount=4)
+    file_handler.setFormatter(JsonFormatter(process_name))
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(TickQueueHandler(log_queue))
+
+def stop_listener():
+    if listener is not None:
+        listener.stop()
+
+def setup_logging(process_name, level=logging.INFO, per_process=False):
+    """
+    Send this process's logging through a queue to a background thread writing JSON lines
+
+    Each process name gets its own log file and rotation. per_process adds the pid to the
+    file name, for worker processes that share a name; a forked child always gets its own
+    file (and writer thread, since threads don't survive a fork).
+    """
+
+    global configured
+    if configured:
+        return
+    configured = True
+    logging.getLogger().setLevel(level)
+    start_listener(process_name, per_process)
+    os.register_at_fork(after_in_child=lambda: start_listener(process_name, True))
+    atexit.register(stop_listener)
+
+@contextmanager
+def tick_context(game_id=None, tick_id=None):
+    """
+    Tag every record logged inside the block with one correlation id
+    """
+
+    token = current_tick.set({'tick_id': uuid.uuid4().hex[:12] if tick_id is None else tick_id, 'game_id': game_id})
+    try:
+        yield
+    finally:
+        current_tick.reset(token)
+
+def tick_headers():
+    tick = current_tick.get()
+    return {} if tick is None else {TICK_HEADER: tick['tick_id']}
@@ -0,0 +1,250 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Older snapshots are only useful for recovering from a bad snapshot, so keep a few
+SNAPSHOTS_KEPT = 3
+
+# How long a writer waits for another process's write transaction before giving up
+BUSY_TIMEOUT_SECONDS = 10
+
+class VersionConflict(Exception):
+    """
+    A conditional write found a document at a different version than the writer expected
+    """
+
+    def __init__(self, doc, expected, version):
+        Exception.__init__(self, '{} is at version {}, not {}'.format(doc, version, expected))
+        self.doc = doc
+
+class StateStore():
+    """
+    SQLite (WAL mode) storage for the state server's documents
+
+    Each top-level field of a document is its own row, so a partial update only
+    rewrites the fields that changed. Every write is a single transaction and bumps
+    the document's version, which the server hands out as its ETag.
+
+    Every thread of every process gets its own connection, so any number of server
+    threads and worker processes can share one database file: WAL readers don't block
+    each other or the writer, and BEGIN IMMEDIATE queues writers up behind each other.
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.local = threading.local()
+        conn = self.connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS fields (doc TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (doc, key))')
+        conn.execute('CREATE TABLE IF NOT EXISTS versions (doc TEXT PRIMARY KEY, version INTEGER NOT NULL, modified REAL NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS events (game_id TEXT NOT NULL, seq INTEGER NOT NULL, event TEXT NOT NULL, PRIMARY KEY (game_id, seq))')
+        conn.execute('CREATE TABLE IF NOT EXISTS snapshots (game_id TEXT NOT NULL, seq INTEGER NOT NULL, state TEXT NOT NULL, PRIMARY KEY (game_id, seq))')
+        conn.execute('CREATE TABLE IF NOT EXISTS metrics (kind TEXT NOT NULL, name TEXT NOT NULL, labels TEXT NOT NULL, '
+            'value NUMERIC NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (kind, name, labels))')
+
+    def connection(self):
+        """
+        This thread's connection, opened on first use (and again in a forked child)
+        """
+
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.fname, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self, mode='IMMEDIATE'):
+        """
+        Run a block in one transaction on this thread's connection: IMMEDIATE for writes,
+        DEFERRED for reads that must see a single snapshot of the database. A block run
+        inside another one joins it, so several store calls can be made atomic together.
+        """
+
+        conn = self.connection()
+        if conn.in_transaction:
+            # The outermost block commits or rolls back for everything inside it
+            yield conn
+            return
+        conn.execute('BEGIN ' + mode)
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get(self, doc):
+        rows = self.connection().execute('SELECT key, value FROM fields WHERE doc = ?', (doc,)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def version(self, doc):
+        """
+        Return (version, modified time) for a document, (0, 0) if it was never written
+        """
+
+        row = self.connection().execute('SELECT version, modified FROM versions WHERE doc = ?', (doc,)).fetchone()
+        return (0, 0) if row is None else row
+
+    def bump_version(self, conn, doc):
+        conn.execute('INSERT INTO versions (doc, version, modified) VALUES (?, 1, ?) '
+            'ON CONFLICT(doc) DO UPDATE SET version = version + 1, modified = excluded.modified', (doc, time.time()))
+        return conn.execute('SELECT version FROM versions WHERE doc = ?', (doc,)).fetchone()[0]
+
+    def field_values(self, key, doc_suffix):
+        """
+        Return {doc: value} of one field across every document whose name ends with the suffix
+        """
+
+        rows = self.connection().execute('SELECT doc, value FROM fields WHERE key = ? AND doc LIKE ?', (key, '%' + doc_suffix)).fetchall()
+        return {doc: json.loads(value) for doc, value in rows}
+
+    def rename(self, old_doc, new_doc):
+        with self.transaction() as conn:
+            conn.execute('UPDATE fields SET doc = ? WHERE doc = ?', (new_doc, old_doc))
+            conn.execute('UPDATE versions SET doc = ? WHERE doc = ?', (new_doc, old_doc))
+
+    def exists(self, doc):
+        return self.connection().execute('SELECT 1 FROM fields WHERE doc = ? LIMIT 1', (doc,)).fetchone() is not None
+
+    def read(self, docs):
+        """
+        Return {doc: (version, modified time, data)} for several documents as of one moment
+        """
+
+        result = {}
+        with self.transaction('DEFERRED') as conn:
+            for doc in docs:
+                row = conn.execute('SELECT version, modified FROM versions WHERE doc = ?', (doc,)).fetchone()
+                rows = conn.execute('SELECT key, value FROM fields WHERE doc = ?', (doc,)).fetchall()
+                version, modified = (0, 0) if row is None else row
+                result[doc] = (version, modified, {key: json.loads(value) for key, value in rows})
+        return result
+
+    def write(self, writes, expected=None):
+        """
+        Apply several (doc, data, replace) writes in one transaction and return the new versions in order
+
+        A replace write swaps the whole document for data, otherwise only the fields in data are updated.
+        expected maps documents to the version the writer based its data on; if any has moved on,
+        VersionConflict is raised and nothing is written.
+        """
+
+        return self.write_with_events(writes, None, [], expected)[0]
+
+    def write_with_events(self, writes, game_id, events, expected=None):
+        """
+        write() that also appends events to a game's log in the same transaction, so the
+        log never misses what the documents already show. Returns (versions, last event seq).
+        """
+
+        writes = [(doc, [(doc, key, json.dumps(value)) for key, value in data.items()], replace) for doc, data, replace in writes]
+        versions = []
+        seq = None
+        with self.transaction() as conn:
+            for doc, version in (expected or {}).items():
+                row = conn.execute('SELECT version FROM versions WHERE doc = ?', (doc,)).fetchone()
+                current = 0 if row is None else row[0]
+                if current != version:
+                    raise VersionConflict(doc, version, current)
+            for doc, rows, replace in writes:
+                if replace:
+                    conn.execute('DELETE FROM fields WHERE doc = ?', (doc,))
+                conn.executemany('INSERT OR REPLACE INTO fields (doc, key, value) VALUES (?, ?, ?)', rows)
+                versions.append(self.bump_version(conn, doc))
+            if len(events) > 0:
+                seq = self.insert_events(conn, game_id, events)
+        return versions, seq
+
+    def replace(self, doc, data, expected=None):
+        return self.write([(doc, data, True)], expected)[0]
+
+    def patch(self, doc, delta, expected=None):
+        return self.write([(doc, delta, False)], expected)[0]
+
+    def import_json(self, doc, fname):
+        """
+        Seed an empty document from one of the JSON files the server used to write
+        """
+
+        if self.exists(doc) or not os.path.exists(fname):
+            return False
+        with open(fname) as json_data:
+            data = json.load(json_data)
+        if isinstance(data, str):
+            data = json.loads(data)
+        self.replace(doc, data)
+        return True
+
+    def append_events(self, game_id, events):
+        """
+        Append events to a game's log and return the sequence number of the last one
+        """
+
+        with self.transaction() as conn:
+            return self.insert_events(conn, game_id, events)
+
+    def insert_events(self, conn, game_id, events):
+        # Callers hold a write transaction
+        last_seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM events WHERE game_id = ?', (game_id,)).fetchone()[0]
+        rows = [(game_id, last_seq + i + 1, json.dumps(event)) for i, event in enumerate(events)]
+        conn.executemany('INSERT INTO events (game_id, seq, event) VALUES (?, ?, ?)', rows)
+        return last_seq + len(events)
+
+    def events_since(self, game_id, seq):
+        """
+        Return [(seq, event)] for a game's events after seq, oldest first
+        """
+
+        rows = self.connection().execute('SELECT seq, event FROM events WHERE game_id = ? AND seq > ? ORDER BY seq', (game_id, seq)).fetchall()
+        return [(row_seq, json.loads(event)) for row_seq, event in rows]
+
+    def latest_snapshot(self, game_id):
+        """
+        Return (seq, state) of a game's newest snapshot, (0, None) if it has none
+        """
+
+        row = self.connection().execute('SELECT seq, state FROM snapshots WHERE game_id = ? ORDER BY seq DESC LIMIT 1', (game_id,)).fetchone()
+        return (0, None) if row is None else (row[0], json.loads(row[1]))
+
+    def save_snapshot(self, game_id, seq, state, keep=SNAPSHOTS_KEPT):
+        with self.transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO snapshots (game_id, seq, state) VALUES (?, ?, ?)', (game_id, seq, json.dumps(state)))
+            conn.execute('DELETE FROM snapshots WHERE game_id = ? AND seq NOT IN '
+                '(SELECT seq FROM snapshots WHERE game_id = ? ORDER BY seq DESC LIMIT ?)', (game_id, game_id, keep))
+
+    def clear_events(self, game_id):
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM events WHERE game_id = ?', (game_id,))
+            conn.execute('DELETE FROM snapshots WHERE game_id = ?', (game_id,))
+
+    def merge_metrics(self, snapshot):
+        """
+        Add a games.Metrics take() snapshot into the stored totals, so every server process serves the same numbers
+        """
+
+        counters = [('counter', name, json.dumps(labels), value, 0) for name, labels, value in snapshot.get('counters', [])]
+        gauges = [('gauge', name, json.dumps(labels), value, 0) for name, labels, value in snapshot.get('gauges', [])]
+        summaries = [('summary', name, json.dumps(labels), total, count) for name, labels, count, total in snapshot.get('summaries', [])]
+        with self.transaction() as conn:
+            conn.executemany('INSERT INTO metrics (kind, name, labels, value, count) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(kind, name, labels) DO UPDATE SET value = value + excluded.value, count = count + excluded.count', counters + summaries)
+            conn.executemany('INSERT OR REPLACE INTO metrics (kind, name, labels, value, count) VALUES (?, ?, ?, ?, ?)', gauges)
+
+    def metrics_snapshot(self):
+        """
+        The stored totals in games.Metrics take() format
+        """
+
+        snapshot = {'counters': [], 'gauges': [], 'summaries': []}
+        for kind, name, labels, value, count in self.connection().execute('SELECT kind, name, labels, value, count FROM metrics').fetchall():
+            if kind == 'summary':
+                snapshot['summaries'].append([name, json.loads(labels), count, value])
+            else:
+                snapshot[kind + 's'].append([name, json.loads(labels), value])
+        return snapshot
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Micro-benchmark for games.Commands against the per-handler loops it replaced.
+#
+#   python -m benchmarks.commands_benchmark --comments 100000
+import argparse
+import random
+import time
+
+from games.Commands import find_command, parse_commands
+
+def legacy_target(body, command):
+    # The nested loop the comment and PM handlers used before games.Commands
+    target = ''
+    for line in body.lower().split('\n'):
+        if command in line:
+            parts = line.split()
+            for i in range(len(parts)):
+                word = parts[i]
+                if command in word:
+                    if i + 1 < len(parts):
+                        if parts[i+1].startswith('/u/'):
+                            target = parts[i+1][3:]
+                        elif parts[i+1].startswith('u/'):
+                            target = parts[i+1][2:]
+                        else:
+                            target = parts[i+1]
+    return target
+
+def legacy_handler(body):
+    found = {}
+    for command in ['!vote', '!table', '!kill', '!target']:
+        if command in body.lower():
+            found[command] = legacy_target(body, command)
+    return found
+
+def parser_handler(body):
+    commands = parse_commands(body)
+    found = {}
+    for name in ['vote', 'table', 'kill', 'target']:
+        command = find_command(commands, name)
+        if command is not None:
+            found[name] = command.target
+    return found
+
+def make_comments(count, players, seed):
+    rng = random.Random(seed)
+    chatter = ['I think', 'they are', 'super scummy', 'because', 'of the way', 'they voted yesterday', 'lol']
+    prefixes = ['', 'u/', '/u/', '**u/']
+    comments = []
+    for i in range(count):
+        lines = [' '.join(rng.choice(chatter) for _ in range(rng.randint(3, 15))) for _ in range(rng.randint(1, 6))]
+        if rng.random() < 0.6:
+            lines.insert(rng.randint(0, len(lines)), '!vote {}{}'.format(rng.choice(prefixes), rng.choice(players)))
+        if rng.random() < 0.1:
+            lines.append('!table')
+        comments.append('\n\n'.join(lines))
+    return comments
+
+def run(name, handler, comments):
+    start = time.perf_counter()
+    for body in comments:
+        handler(body)
+    elapsed = time.perf_counter() - start
+    print('{:>8}: {:8.3f}s  {:12,.0f} comments/s'.format(name, elapsed, len(comments) / elapsed))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark command parsing throughput')
+    parser.add_argument('--comments', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    players = ['player{}'.format(i) for i in range(50)]
+    comments = make_comments(args.comments, players, args.seed)
+    print('Parsing {} synthetic comments'.format(len(comments)))
+    run('legacy', legacy_handler, comments)
+    run('parser', parser_handler, comments)
+
+if __name__ == '__main__':
+    main()
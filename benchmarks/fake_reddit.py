@@ -0,0 +1,268 @@
+# In-process stand-in for the parts of praw that periodical.py and the games use,
+# so ticks can be driven and measured without touching Reddit. Every method that
+# would make a request counts it in FakeReddit.calls.
+import itertools
+import math
+import time
+from collections import Counter
+
+def base36(number):
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    encoded = ''
+    while True:
+        number, digit = divmod(number, 36)
+        encoded = digits[digit] + encoded
+        if number == 0:
+            return encoded
+
+class FakeAuthor:
+    def __init__(self, name):
+        self.name = name
+
+class FakeMod:
+    def __init__(self, reddit, target):
+        self.reddit = reddit
+        self.target = target
+
+    def remove(self):
+        self.reddit.api_call('remove')
+        self.target.removed = True
+
+    def lock(self):
+        self.reddit.api_call('lock')
+        self.target.locked = True
+
+    def update(self, **settings):
+        self.reddit.api_call('subreddit_update')
+        self.target.settings.update(settings)
+
+class FakeContributors:
+    def __init__(self, reddit, subreddit):
+        self.reddit = reddit
+        self.subreddit = subreddit
+
+    def add(self, name):
+        self.reddit.api_call('contributor_add')
+        self.subreddit.contributors.add(name)
+
+    def remove(self, name):
+        self.reddit.api_call('contributor_remove')
+        self.subreddit.contributors.discard(name)
+
+class FakeComment:
+    def __init__(self, reddit, submission, author, body, created_utc):
+        self.reddit = reddit
+        self.id = reddit.new_id()
+        self.fullname = 't1_' + self.id
+        self.submission = submission
+        self.link_id = submission.fullname
+        self.author = FakeAuthor(author)
+        self.body = body
+        self.created_utc = created_utc
+        self.removed = False
+        self.mod = FakeMod(reddit, self)
+
+    def reply(self, text):
+        return self.reddit.post('api/comment/', data={'text': text, 'thing_id': self.fullname})
+
+class FakeCommentForest:
+    def __init__(self, submission):
+        self.submission = submission
+
+    def replace_more(self, limit=32):
+        # Reddit returns ~200 comments with the submission and 100 per "more" request after that
+        extra = max(0, len(self.submission.all_comments) - 200)
+        for _ in range(math.ceil(extra / 100)):
+            self.submission.reddit.api_call('more_children')
+        return []
+
+    def list(self):
+        return list(self.submission.all_comments)
+
+class FakeSubmission:
+    def __init__(self, reddit, subreddit, title, selftext, created_utc):
+        self.reddit = reddit
+        self.id = reddit.new_id()
+        self.fullname = 't3_' + self.id
+        self.subreddit = subreddit
+        self.title = title
+        self.selftext = selftext
+        self.created_utc = created_utc
+        self.all_comments = []
+        self.comments_sort = 'confidence'
+        self.locked = False
+        self.mod = FakeMod(reddit, self)
+
+class FakeSubmissionHandle:
+    """
+    What reddit.submission() and submit() hand out: like praw, the first access to a
+    field other than the id fetches the submission, and later accesses reuse it
+    """
+
+    def __init__(self, submission):
+        self._submission = submission
+        self._fetched = False
+        self.id = submission.id
+        self.fullname = submission.fullname
+        self.mod = submission.mod
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if not self._fetched:
+            self._submission.reddit.api_call('submission_fetch')
+            self._fetched = True
+        if name == 'comments':
+            return FakeCommentForest(self._submission)
+        return getattr(self._submission, name)
+
+class FakeSubreddit:
+    def __init__(self, reddit, display_name):
+        self.reddit = reddit
+        self.display_name = display_name
+        self.all_comments = []
+        self.settings = {}
+        self.contributors = set()
+        self.mod = FakeMod(reddit, self)
+        self.contributor = FakeContributors(reddit, self)
+
+    def submit(self, title, selftext='', send_replies=True, **kwargs):
+        self.reddit.api_call('submit')
+        submission = FakeSubmission(self.reddit, self, title, selftext, self.reddit.tick())
+        self.reddit.submissions[submission.id] = submission
+        return FakeSubmissionHandle(submission)
+
+    def comments(self, limit=100):
+        # Newest first, one request per page of 100, capped like Reddit's listings
+        count = 0
+        for comment in reversed(self.all_comments):
+            if limit is not None and count >= limit or count >= 1000:
+                return
+            if count % 100 == 0:
+                self.reddit.api_call('listing_page')
+            count += 1
+            yield comment
+        if count % 100 == 0:
+            self.reddit.api_call('listing_page')
+
+class FakeRedditor:
+    def __init__(self, reddit, name):
+        self.reddit = reddit
+        self.name = name
+
+    def message(self, subject=None, message=None, from_subreddit=None):
+        self.reddit.api_call('message')
+        self.reddit.sent_messages.append((self.name, subject, message))
+
+class FakeMessage:
+    def __init__(self, reddit, author, subject, body):
+        self.reddit = reddit
+        self.id = reddit.new_id()
+        self.fullname = 't4_' + self.id
+        self.author = FakeAuthor(author)
+        self.subject = subject
+        self.body = body
+        self.created_utc = reddit.tick()
+
+    def reply(self, text):
+        return self.reddit.post('api/comment/', data={'text': text, 'thing_id': self.fullname})
+
+    def mark_read(self):
+        self.reddit.inbox.mark_read([self])
+
+class FakeInbox:
+    def __init__(self, reddit):
+        self.reddit = reddit
+        self.unread_messages = []
+
+    def unread(self, limit=100, mark_read=False):
+        messages = list(self.unread_messages if limit is None else self.unread_messages[:limit])
+        for _ in range(max(1, math.ceil(len(messages) / 100))):
+            self.reddit.api_call('inbox_page')
+        return iter(messages)
+
+    def mark_read(self, items):
+        for _ in range(math.ceil(len(items) / 25)):
+            self.reddit.api_call('mark_read')
+        read = set(item.id for item in items)
+        self.unread_messages = [message for message in self.unread_messages if message.id not in read]
+
+class FakeAuth:
+    def __init__(self, reddit):
+        self.reddit = reddit
+
+    @property
+    def limits(self):
+        if self.reddit.rate_limit is None:
+            return {'remaining': None, 'used': None}
+        used = sum(self.reddit.calls.values())
+        return {'remaining': max(0, self.reddit.rate_limit - used), 'used': used}
+
+class FakeReddit:
+    def __init__(self, latency=0, rate_limit=None, bot_name='AutoWolfBot'):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.bot_name = bot_name
+        self.calls = Counter()
+        self.ids = itertools.count(1000)
+        # Simulated clock for created_utc, always a little behind real time
+        self.clock = time.time() - 3600
+        self.subreddits = {}
+        self.submissions = {}
+        self.comments = {}
+        self.sent_messages = []
+        self.replies = []
+        self.inbox = FakeInbox(self)
+        self.auth = FakeAuth(self)
+
+    def api_call(self, name):
+        self.calls[name] += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def new_id(self):
+        return base36(next(self.ids))
+
+    def tick(self):
+        self.clock += 0.01
+        return self.clock
+
+    def subreddit(self, display_name):
+        if display_name not in self.subreddits:
+            self.subreddits[display_name] = FakeSubreddit(self, display_name)
+        return self.subreddits[display_name]
+
+    def submission(self, id):
+        return FakeSubmissionHandle(self.submissions[id])
+
+    def comment(self, id):
+        return self.comments[id]
+
+    def redditor(self, name):
+        return FakeRedditor(self, name)
+
+    def post(self, path, data):
+        self.api_call('reply')
+        self.replies.append((data['thing_id'], data['text']))
+        if data['thing_id'].startswith('t1_'):
+            comment = self.comment(data['thing_id'][3:])
+            return self.add_comment(comment.submission.id, self.bot_name, data['text'])
+        return None
+
+    # Load generation helpers, not part of the praw surface
+
+    def add_comment(self, submission_id, author, body):
+        submission = self.submissions[submission_id]
+        comment = FakeComment(self, submission, author, body, self.tick())
+        self.comments[comment.id] = comment
+        submission.all_comments.append(comment)
+        submission.subreddit.all_comments.append(comment)
+        return comment
+
+    def send_pm(self, author, body, subject='Action'):
+        message = FakeMessage(self, author, subject, body)
+        self.inbox.unread_messages.append(message)
+        return message
+
+    def age_submission(self, submission_id, seconds):
+        self.submissions[submission_id].created_utc -= seconds
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# Load test for hww_server in its production layout: several pre-forked worker processes
+# accepting on one socket (the way gunicorn runs it) over one SQLite database. Client
+# processes hammer GET /tick-state/ while one writer saves a tick a second, and the
+# read throughput is reported for each worker count.
+#
+#   python -m benchmarks.server_load --workers 1 2 4 --clients 8 --seconds 5
+#
+# Workers serve with werkzeug so the test runs without gunicorn installed. Throughput
+# only scales while there are idle cores for the extra workers (and the clients).
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+import hww_server
+
+game_id = 'load'
+
+def serve(sock):
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    make_server('127.0.0.1', sock.getsockname()[1], hww_server.app, threaded=True, fd=sock.fileno()).serve_forever()
+
+def read_load(url, seconds, results):
+    session = requests.Session()
+    latencies = []
+    until = time.time() + seconds
+    while time.time() < until:
+        start = time.perf_counter()
+        session.get(url + '/games/{}/tick-state/'.format(game_id)).raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    results.put(latencies)
+
+def write_load(url, seconds, results):
+    session = requests.Session()
+    writes = 0
+    until = time.time() + seconds
+    while time.time() < until:
+        update = {'game': {'last_comment_time': time.time()}, 'phase': {'votes': {'player0': 'player{}'.format(writes % 50)}}}
+        session.post(url + '/games/{}/tick-state/'.format(game_id), {'json': json.dumps(update)}).raise_for_status()
+        writes += 1
+        time.sleep(1)
+    results.put(writes)
+
+def seed(url, players):
+    session = requests.Session()
+    names = ['player{}'.format(i) for i in range(players)]
+    session.post(url + '/games/{}/new-game/'.format(game_id), {'json': json.dumps({'game_type': 'test'})}).raise_for_status()
+    game = {'game_phase': 1,
+            'live_players': names,
+            'confirmed_players': names,
+            'roles': {name: 'Vanilla Town' for name in names}}
+    phase = {'votes': {name: names[(i + 1) % players] for i, name in enumerate(names)}, 'actions': {}, 'wolf_kill': '', 'wolf_killer': ''}
+    session.post(url + '/games/{}/tick-state/'.format(game_id), {'json': json.dumps({'game': game, 'phase': phase})}).raise_for_status()
+
+def run(workers, clients, seconds, players):
+    database = tempfile.mkdtemp()
+    hww_server.state_db_fname = os.path.join(database, 'state.db')
+    hww_server.active_game_fname = os.path.join(database, 'active_game.json')
+    hww_server.active_phase_fname = os.path.join(database, 'active_phase.json')
+    hww_server.store = None
+
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(128)
+    url = 'http://127.0.0.1:{}'.format(sock.getsockname()[1])
+    servers = [multiprocessing.Process(target=serve, args=(sock,), daemon=True) for i in range(workers)]
+    for server in servers:
+        server.start()
+    try:
+        seed(url, players)
+        results = multiprocessing.Queue()
+        loaders = [multiprocessing.Process(target=read_load, args=(url, seconds, results)) for i in range(clients)]
+        loaders.append(multiprocessing.Process(target=write_load, args=(url, seconds, results)))
+        for loader in loaders:
+            loader.start()
+        gathered = [results.get() for loader in loaders]
+        for loader in loaders:
+            loader.join()
+    finally:
+        for server in servers:
+            server.terminate()
+        sock.close()
+
+    latencies = sorted(latency for result in gathered if isinstance(result, list) for latency in result)
+    writes = sum(result for result in gathered if isinstance(result, int))
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print('{:>7} {:>12.0f} {:>9.1f} {:>9.1f} {:>7}'.format(workers, len(latencies) / seconds, p50, p99, writes))
+
+def main():
+    parser = argparse.ArgumentParser(description='Read throughput of hww_server by worker process count')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=8, help='concurrent reader processes')
+    parser.add_argument('--seconds', type=int, default=5)
+    parser.add_argument('--players', type=int, default=50, help='size of the game being read')
+    args = parser.parse_args()
+
+    # Workers inherit the listening socket, so they have to be forked
+    multiprocessing.set_start_method('fork')
+    print('{} cores'.format(os.cpu_count()))
+    print('{:>7} {:>12} {:>9} {:>9} {:>7}'.format('Workers', 'Reads/s', 'p50 ms', 'p99 ms', 'Writes'))
+    for workers in args.workers:
+        run(workers, args.clients, args.seconds, args.players)
+
+if __name__ == '__main__':
+    main()
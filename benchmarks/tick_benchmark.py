@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# End-to-end tick benchmark against benchmarks.fake_reddit. Reports wall time, Reddit
+# API calls and peak Python memory for each stage of a simulated game.
+#
+#   python -m benchmarks.tick_benchmark --players 200 --votes 5000 --pms 2000
+import argparse
+import logging
+import random
+import time
+import tracemalloc
+
+import periodical
+from benchmarks.fake_reddit import FakeReddit
+from games.BaseGame import BaseGame
+from games.RedditCache import cache_for
+
+class LoadGame(BaseGame):
+    """
+    Minimal game with a configurable player count, for load generation
+    """
+
+    def __init__(self, reddit, game_data, phase_data, players=9):
+        self.players = players
+        BaseGame.__init__(self, reddit, game_data, phase_data)
+
+    def game_type(self):
+        return 'load'
+
+    def player_limit(self):
+        return self.players
+
+    def signup_post_title(self):
+        return 'Load Test Signups'
+
+    def signup_post_text(self):
+        return 'Comment `!signup` to join.'
+
+    def phase_post_title(self):
+        return 'Phase {}'.format(self.game_phase)
+
+    def phase_post_text(self, sorted_votes, voted_out, wolf_kill, is_wolf_sub):
+        return 'Living Players:\n\n* {}'.format('\n* '.join(self.live_players))
+
+    def assign_roles(self):
+        players = self.live_players.to_list()
+        self.rng('roles').shuffle(players)
+        wolves = max(1, len(players) // 4)
+        for i, player in enumerate(players):
+            self.roles[player] = 'Vanilla Wolf' if i < wolves else 'Vanilla Town'
+
+    def role_pm_text(self, player):
+        return 'Your role is **{}**'.format(self.roles[player])
+
+class Stage:
+    def __init__(self, reddit, name):
+        self.reddit = reddit
+        self.name = name
+
+    def __enter__(self):
+        self.calls_before = self.reddit.calls.copy()
+        tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        peak = tracemalloc.get_traced_memory()[1]
+        calls = self.reddit.calls - self.calls_before
+        breakdown = ', '.join('{} {}'.format(name, count) for name, count in calls.most_common())
+        print('{:<28} {:>10.1f} ms {:>7} calls {:>9.0f} KiB  {}'.format(self.name, elapsed * 1000, sum(calls.values()), peak / 1024, breakdown))
+
+def tick(game):
+    # run_tick without the save to the state server
+    periodical.step_game(game)
+    game.mark_inbox_read()
+
+def drain(reddit, game, name):
+    with Stage(reddit, name):
+        game.outbound.drain(reddit)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark game ticks against a fake Reddit')
+    parser.add_argument('--players', type=int, default=100)
+    parser.add_argument('--votes', type=int, default=2000, help='vote comments in the main sub thread')
+    parser.add_argument('--kills', type=int, default=200, help='kill comments in the wolf sub thread')
+    parser.add_argument('--pms', type=int, default=1000, help='action PMs in the inbox')
+    parser.add_argument('--latency', type=float, default=0, help='simulated seconds per API call')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    logging.getLogger().setLevel(logging.WARNING)
+    tracemalloc.start()
+    reddit = FakeReddit(latency=args.latency)
+    players = ['player{}'.format(i) for i in range(args.players)]
+
+    # Signups
+    game = LoadGame(reddit, {}, {}, args.players)
+    with Stage(reddit, 'init'):
+        tick(game)
+    for player in players:
+        reddit.add_comment(game.main_post_id, player, 'I\'m in!\n\n!signup')
+    with Stage(reddit, 'signup tick'):
+        tick(game)
+    drain(reddit, game, 'signup drain')
+
+    # Confirmations: tick until every role PM has been sent
+    ticks = 0
+    with Stage(reddit, 'role PM ticks'):
+        while ticks < args.players * 2 and sum(1 for message in reddit.sent_messages if message[1] == 'Role Assignment') < args.players:
+            tick(game)
+            game.outbound.drain(reddit)
+            ticks += 1
+    print('{:<28} {:>10}'.format('  ticks to send role PMs', ticks))
+
+    # Game phase, loaded from stored state the way periodical.py would
+    roles = dict(game.roles)
+    main_post = reddit.subreddit(game.main_sub_name).submit(title='Phase 1', selftext='')
+    wolf_post = reddit.subreddit(game.wolf_sub_name).submit(title='WOLF SUB Phase 1', selftext='')
+    game_data = {'game_phase': 1,
+                 'main_post_id': main_post.id,
+                 'wolf_post_id': wolf_post.id,
+                 'roles': roles,
+                 'live_players': list(players),
+                 'confirmed_players': list(players),
+                 'last_comment_time': reddit.clock,
+                 'last_wolf_comment_time': reddit.clock,
+                 'phase_deadline': time.time() + 24 * 3600}
+    game = LoadGame(reddit, game_data, {}, args.players)
+    wolves = [player for player in players if 'Wolf' in roles[player]]
+    for i in range(args.votes):
+        body = '!vote u/{}'.format(random.choice(players))
+        if i % 20 == 0:
+            body += '\n\n!table'
+        reddit.add_comment(main_post.id, random.choice(players), body)
+    for i in range(args.kills):
+        reddit.add_comment(wolf_post.id, random.choice(wolves), '!kill {}'.format(random.choice(players)))
+    for i in range(args.pms):
+        reddit.send_pm(random.choice(players), '!target u/{}'.format(random.choice(players)))
+
+    with Stage(reddit, 'busy game tick'):
+        tick(game)
+    drain(reddit, game, 'busy game drain')
+    with Stage(reddit, 'idle game tick'):
+        tick(game)
+    game.phase_deadline = time.time() - 1
+    with Stage(reddit, 'turnover tick'):
+        tick(game)
+    drain(reddit, game, 'turnover drain')
+
+    print('{:<28} {:>10} calls in total'.format('', sum(reddit.calls.values())))
+    cache = cache_for(reddit)
+    print('{:<28} {:>10} hits, {} misses, {} fetches avoided'.format('  handle cache', cache.hits, cache.misses, cache.fetches_avoided))
+
+if __name__ == '__main__':
+    main()
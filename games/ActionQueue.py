@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import time
+from games.Metrics import registry
+from games.RedditCache import cache_for
+
+# Requests to leave in the rate-limit window for comment fetches and posting
+RATE_LIMIT_RESERVE = 10
+# How long to back off when the window is exhausted and Reddit didn't say when it resets
+RATE_LIMIT_PAUSE = 60
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_SECONDS = 30
+
+class ActionQueue:
+    """
+    Persistent queue of outbound Reddit side effects (replies, PMs, removals, locks)
+
+    Handlers enqueue actions while they process a tick and the queue is drained
+    afterwards, so the tick itself never waits on Reddit. The pending list is plain
+    JSON and is stored with the game data so nothing is lost between runs, along with the
+    keys of actions given up on, until the game has taken them with take_dropped().
+    """
+
+    def __init__(self, pending=None, dropped=None):
+        self.pending = [] if pending is None else pending
+        self.dropped = [] if dropped is None else dropped
+
+    def enqueue(self, action, params, delay=0, key=None):
+        entry = {'action': action,
+                 'params': params,
+                 'not_before': time.time() + delay,
+                 'attempts': 0}
+        if key is not None:
+            # Lets the game tell when an action it cares about has left the queue
+            entry['key'] = key
+        self.pending.append(entry)
+
+    def reply(self, thing, text, delay=0):
+        self.enqueue('reply', {'thing_id': thing.fullname, 'text': text}, delay)
+
+    def remove(self, comment, delay=0):
+        self.enqueue('remove', {'comment_id': comment.id}, delay)
+
+    def message(self, player, subject, text, delay=0, key=None):
+        self.enqueue('message', {'to': player, 'subject': subject, 'text': text}, delay, key)
+
+    def lock(self, submission_id, delay=0):
+        self.enqueue('lock', {'submission_id': submission_id}, delay)
+
+    def pending_keys(self):
+        return set(entry['key'] for entry in self.pending if 'key' in entry)
+
+    def take_dropped(self):
+        dropped = set(self.dropped)
+        del self.dropped[:]
+        return dropped
+
+    def next_ready_time(self):
+        if len(self.pending) < 1:
+            return None
+        return min(entry['not_before'] for entry in self.pending)
+
+    def perform(self, reddit, entry):
+        params = entry['params']
+        if entry['action'] == 'reply':
+            # Same call Comment.reply and Message.reply make, without rebuilding the object
+            reddit.post('api/comment/', data={'text': params['text'], 'thing_id': params['thing_id']})
+        elif entry['action'] == 'remove':
+            reddit.comment(params['comment_id']).mod.remove()
+        elif entry['action'] == 'message':
+            cache_for(reddit).redditor(params['to']).message(subject=params['subject'], message=params['text'])
+        elif entry['action'] == 'lock':
+            cache_for(reddit).submission(params['submission_id']).mod.lock()
+        else:
+            raise Exception('Unknown outbound action {}'.format(entry['action']))
+
+    def rate_limit_wait(self, reddit):
+        """
+        Seconds to wait before the next request, based on the last rate-limit headers seen
+        """
+
+        limits = reddit.auth.limits
+        if limits.get('remaining') is None or limits['remaining'] > RATE_LIMIT_RESERVE:
+            return 0
+        if limits.get('reset_timestamp') is not None:
+            return max(0, limits['reset_timestamp'] - time.time())
+        return RATE_LIMIT_PAUSE
+
+    def pause_before_next(self, reddit, deadline):
+        """
+        Seconds to sleep before the next request, or None if the budget doesn't allow waiting that long
+        """
+
+        wait = self.rate_limit_wait(reddit)
+        if deadline is not None and time.time() + wait > deadline:
+            if wait > 0:
+                logging.info('Rate limit nearly exhausted, leaving %s outbound actions queued', len(self.pending))
+            return None
+        return wait
+
+    def ready(self):
+        # One sorted snapshot per pass; earliest due first, in queue order among equals
+        now = time.time()
+        return sorted((entry for entry in self.pending if entry['not_before'] <= now), key=lambda entry: entry['not_before'])
+
+    def finish(self, done):
+        # Drop the sent and given-up entries in one pass, keeping the rest (including retries) in order
+        if len(done) > 0:
+            self.pending[:] = [entry for entry in self.pending if id(entry) not in done]
+
+    def sent(self, entry, done):
+        done.add(id(entry))
+        registry.inc('hww_outbound_actions_total', action=entry['action'], result='sent')
+
+    def drain(self, reddit, budget_seconds=None):
+        """
+        Perform ready actions in order until the queue is empty, nothing is ready yet, or
+        the time budget runs out. Returns the number of actions completed or dropped.
+        """
+
+        deadline = None if budget_seconds is None else time.time() + budget_seconds
+        handled = 0
+        while True:
+            ready = self.ready()
+            if len(ready) < 1:
+                return handled
+            # id() of every entry sent or dropped in this pass
+            done = set()
+            try:
+                for entry in ready:
+                    wait = self.pause_before_next(reddit, deadline)
+                    if wait is None:
+                        return handled
+                    if wait > 0:
+                        time.sleep(wait)
+                    try:
+                        self.perform(reddit, entry)
+                        self.sent(entry, done)
+                        handled += 1
+                    except Exception as e:
+                        if self.failed(entry, e):
+                            done.add(id(entry))
+                            handled += 1
+            finally:
+                self.finish(done)
+
+    def failed(self, entry, error):
+        """
+        Schedule a retry with exponential backoff, or give up on the action once it has used
+        up its attempts. Returns 1 if it was given up on; the caller takes it off the queue.
+        """
+
+        entry['attempts'] += 1
+        if entry['attempts'] >= MAX_ATTEMPTS:
+            logging.error('Dropping outbound %s after %s attempts: %s', entry['action'], entry['attempts'], entry['params'], exc_info=error)
+            if 'key' in entry:
+                self.dropped.append(entry['key'])
+            registry.inc('hww_outbound_actions_total', action=entry['action'], result='dropped')
+            return 1
+        entry['not_before'] = time.time() + RETRY_BACKOFF_SECONDS * 2 ** (entry['attempts'] - 1)
+        registry.inc('hww_outbound_actions_total', action=entry['action'], result='retried')
+        logging.warning('Outbound %s failed (attempt %s), retrying later: %s', entry['action'], entry['attempts'], error)
+        return 0
+
+    async def perform_async(self, reddit, entry):
+        params = entry['params']
+        if entry['action'] == 'reply':
+            await reddit.post('api/comment/', data={'text': params['text'], 'thing_id': params['thing_id']})
+        elif entry['action'] == 'remove':
+            comment = await reddit.comment(params['comment_id'], fetch=False)
+            await comment.mod.remove()
+        elif entry['action'] == 'message':
+            redditor = await reddit.redditor(params['to'], fetch=False)
+            await redditor.message(subject=params['subject'], message=params['text'])
+        elif entry['action'] == 'lock':
+            submission = await reddit.submission(params['submission_id'], fetch=False)
+            await submission.mod.lock()
+        else:
+            raise Exception('Unknown outbound action {}'.format(entry['action']))
+
+    async def drain_async(self, reddit, budget_seconds=None, concurrency=8):
+        """
+        asyncpraw version of drain that sends up to `concurrency` ready actions at once
+        """
+
+        deadline = None if budget_seconds is None else time.time() + budget_seconds
+        handled = 0
+        while True:
+            ready = self.ready()
+            if len(ready) < 1:
+                return handled
+            done = set()
+            try:
+                for start in range(0, len(ready), concurrency):
+                    wait = self.pause_before_next(reddit, deadline)
+                    if wait is None:
+                        return handled
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    batch = ready[start:start + concurrency]
+                    results = await asyncio.gather(*[self.perform_async(reddit, entry) for entry in batch], return_exceptions=True)
+                    for entry, result in zip(batch, results):
+                        if isinstance(result, Exception):
+                            if self.failed(entry, result):
+                                done.add(id(entry))
+                                handled += 1
+                        else:
+                            self.sent(entry, done)
+                            handled += 1
+            finally:
+                self.finish(done)
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+from games.CommentStream import fetch_new_comments_async
+
+class AsyncBaseGame:
+    """
+    asyncio driver for the game-phase tick of any BaseGame subclass
+
+    The main sub thread, wolf sub thread, inbox and turnover post are independent
+    network reads, so they are fetched concurrently with asyncpraw and then handed to
+    the game's ordinary (synchronous, network-free) process_* methods. Turnover, which
+    only posts once a phase, still runs through the game's own praw client in a thread.
+    """
+
+    def __init__(self, game, async_reddit):
+        self.game = game
+        self.reddit = async_reddit
+
+    async def fetch_main_sub_comments(self):
+        subreddit = await self.reddit.subreddit(self.game.main_sub_name)
+        return await fetch_new_comments_async(self.reddit, subreddit, self.game.main_post_id, self.game.last_comment_time)
+
+    async def fetch_wolf_sub_comments(self):
+        subreddit = await self.reddit.subreddit(self.game.wolf_sub_name)
+        return await fetch_new_comments_async(self.reddit, subreddit, self.game.wolf_post_id, self.game.last_wolf_comment_time)
+
+    async def fetch_unread(self):
+        return [message async for message in self.reddit.inbox.unread(limit=None)]
+
+    async def fetch_post_created_utc(self):
+        submission = await self.reddit.submission(self.game.main_post_id)
+        return submission.created_utc
+
+    async def handle_game_phase(self, messages=None):
+        game = self.game
+        logging.debug('Async tick for Phase %s', game.game_phase)
+
+        fetches = [self.fetch_main_sub_comments(), self.fetch_wolf_sub_comments()]
+        if messages is None:
+            fetches.append(self.fetch_unread())
+        # Only state saved before phase deadlines were stored needs the post's creation time
+        if game.phase_deadline is None:
+            fetches.append(self.fetch_post_created_utc())
+        results = await asyncio.gather(*fetches)
+        main_comments, wolf_comments = results[:2]
+        if messages is None:
+            messages = results[2]
+        post_created_utc = results[-1] if game.phase_deadline is None else None
+
+        game.process_main_sub_comments(main_comments)
+        game.process_wolf_sub_comments(wolf_comments)
+        game.process_inbox(messages)
+        # Marked read by mark_inbox_read once the tick is saved
+        game.read_messages.extend(messages)
+        await asyncio.to_thread(game.handle_turnover, post_created_utc)
+
+    async def mark_inbox_read(self):
+        """
+        asyncpraw version of BaseGame.mark_inbox_read
+        """
+
+        game = self.game
+        if len(game.read_messages) > 0:
+            await self.reddit.inbox.mark_read(game.read_messages)
+            game.read_messages = []
+
+    async def drain_outbound(self, budget_seconds=None):
+        return await self.game.outbound.drain_async(self.reddit, budget_seconds)
@@ -1,32 +1,52 @@
 import logging
 import random
-import re
-from time import sleep
-from datetime import datetime, time, timedelta
+from datetime import datetime, time
 from pytz import timezone
+from games.ActionQueue import ActionQueue
+from games.CommentStream import fetch_new_comments
+from games.Commands import find_command, parse_commands
+from games.Confirmations import CONFIRMED, PENDING, Confirmations, role_pm_key
+from games.GameState import GameState, WOLF
+from games.Metrics import registry, timed
+from games.NightActions import resolve_night
+from games.RedditCache import cache_for
+from games.ReplyBatch import ReplyBatch
+from games.VoteTally import VoteTally
 
 class BaseGame:
     def __init__(self, reddit, game_data, phase_data):
-        logging.debug('Building game with game_data {} and phase data {}'.format(game_data, phase_data))
+        logging.debug('Building game with game_data %s and phase data %s', game_data, phase_data)
         self.game_phase = 'init' if 'game_phase' not in game_data else game_data['game_phase']
         self.phase_length_hours = 24 if 'phase_length_hours' not in game_data else int(game_data['phase_length_hours'])
         self.main_sub_name = 'AutomatedWerewolves' if 'main_sub_name' not in game_data else game_data['main_sub_name']
         self.wolf_sub_name = 'AutomatedWolfSub' if 'wolf_sub_name' not in game_data else game_data['wolf_sub_name']
         self.main_post_id = '' if 'main_post_id' not in game_data else game_data['main_post_id']
         self.wolf_post_id = '' if 'wolf_post_id' not in game_data else game_data['wolf_post_id']
-        self.confirmed_players = [] if 'confirmed_players' not in game_data else game_data['confirmed_players']
-        self.roles = {} if 'roles' not in game_data else game_data['roles']
-        self.live_players = [] if 'live_players' not in game_data else game_data['live_players']
-        self.dead_players = [] if 'dead_players' not in game_data else game_data['dead_players']
+        self.state = GameState.from_game_data(game_data)
         self.last_comment_time = 0 if 'last_comment_time' not in game_data else game_data['last_comment_time']
         self.last_wolf_comment_time = 0 if 'last_wolf_comment_time' not in game_data else game_data['last_wolf_comment_time']
-
-        self.votes = {} if 'votes' not in phase_data else phase_data['votes']
+        # Epoch seconds when the current phase turns over; None for state saved before it was stored
+        self.phase_deadline = None if 'phase_deadline' not in game_data else game_data['phase_deadline']
+        self.outbound = ActionQueue([] if 'outbound_queue' not in game_data else game_data['outbound_queue'],
+            [] if 'outbound_dropped' not in game_data else game_data['outbound_dropped'])
+        # Seeds every random choice the game makes, so a replayed game makes the same ones
+        self.rng_seed = random.randrange(2**32) if 'rng_seed' not in game_data else game_data['rng_seed']
+        # State transitions since the last push to the server's event log, see games.EventLog
+        self.events = []
+        self.recorded_cursor = (self.last_comment_time, self.last_wolf_comment_time)
+        # Inbox items handled this tick, marked read only once the tick is saved (see mark_inbox_read)
+        self.read_messages = []
+        self.confirmations = Confirmations({} if 'confirmations' not in game_data else game_data['confirmations'])
+        if self.game_phase == 'confirmation' and 'confirmations' not in game_data:
+            self.migrate_confirmation_marker()
+
+        self.tally = VoteTally({} if 'votes' not in phase_data else phase_data['votes'])
         self.actions = {} if 'actions' not in phase_data else phase_data['actions']
         self.wolf_kill = '' if 'wolf_kill' not in phase_data else phase_data['wolf_kill']
         self.wolf_killer = '' if 'wolf_killer' not in phase_data else phase_data['wolf_killer']
 
         self.reddit = reddit
+        self.cache = cache_for(reddit)
         self.main_sub = reddit.subreddit(self.main_sub_name)
         self.wolf_sub = reddit.subreddit(self.wolf_sub_name)
 
@@ -51,94 +71,172 @@ class BaseGame:
     def assign_roles(self):
         raise Exception('Method [assign_roles] must be implemented in game class')
 
+    def role_pm_text(self, player):
+        raise Exception('Method [role_pm_text] must be implemented in game class')
+
     def send_role_pm(self, player):
-        raise Exception('Method [send_role_pm] must be implemented in game class')
+        self.outbound.message(player, 'Role Assignment', self.role_pm_text(player), key=role_pm_key(player))
+
+    def night_roles(self):
+        """
+        Map of role name to night action type, see games.NightActions
+        """
 
+        return {}
+
+    @timed
     def process_actions(self):
-        raise Exception('Method [handle_actions] must be implemented in game class')
+        result = resolve_night(self.state, self.actions, self.night_roles(), self.wolf_killer, self.wolf_kill)
+        for player, subject, text in result.messages:
+            self.outbound.message(player, subject, text)
+        for player, role in result.role_changes.items():
+            self.state.set_role(player, role)
+            self.record('role_changed', player=player, role=role)
+        for player in result.deaths:
+            self.kill_player(player, 'night')
+        return '' if len(result.deaths) < 1 else result.deaths[0]
+
+    @property
+    def live_players(self):
+        return self.state.live_players
+
+    @property
+    def dead_players(self):
+        return self.state.dead_players
+
+    @property
+    def confirmed_players(self):
+        return self.state.confirmed_players
+
+    @property
+    def roles(self):
+        return self.state.roles
 
     def wolf_count(self):
-        wolf_count = 0
-        for player in self.live_players:
-            if "Wolf" in self.roles[player]:
-                wolf_count += 1
-        return wolf_count
+        return self.state.live_wolves
 
     def town_count(self):
-        town_count = 0
-        for player in self.live_players:
-            if "Town" in self.roles[player]:
-                town_count += 1
-        return town_count
+        return self.state.live_town
+
+    def kill_player(self, player, cause):
+        self.state.kill_player(player)
+        self.record('killed', player=player, cause=cause)
+
+    def involves(self, player):
+        return player in self.live_players or player in self.dead_players or player in self.confirmed_players
+
+    def rng(self, purpose):
+        """
+        Random generator for one decision, seeded from the game's seed and the purpose
+        """
+
+        return random.Random('{}:{}'.format(self.rng_seed, purpose))
+
+    def record(self, event_type, **fields):
+        event = {'type': event_type}
+        event.update(fields)
+        self.events.append(event)
+
+    def pending_events(self):
+        """
+        Events not yet pushed to the server, with the comment cursors if they have moved
+        """
+
+        cursor = (self.last_comment_time, self.last_wolf_comment_time)
+        if cursor != self.recorded_cursor:
+            self.record('cursor', last_comment_time=self.last_comment_time, last_wolf_comment_time=self.last_wolf_comment_time)
+            self.recorded_cursor = cursor
+        return self.events
+
+    def record_phase_started(self):
+        self.record('phase_started', game_phase=self.game_phase, main_post_id=self.main_post_id, wolf_post_id=self.wolf_post_id,
+            phase_deadline=self.phase_deadline, last_comment_time=self.last_comment_time, last_wolf_comment_time=self.last_wolf_comment_time)
+        self.recorded_cursor = (self.last_comment_time, self.last_wolf_comment_time)
+
+    def migrate_confirmation_marker(self):
+        """
+        Confirmation state saved before Confirmations marked a sent role PM by moving the player to the dead list
+        """
+
+        now = datetime.now(timezone('GMT')).timestamp()
+        for player in self.dead_players.to_list():
+            self.state.add_live(player)
+            self.confirmations.sent(player, now)
+            self.record('role_pm_sent', player=player, at=now)
+        for player in self.confirmed_players:
+            self.confirmations.confirm(player)
+
+    def start_phase_clock(self):
+        self.phase_deadline = datetime.now(timezone('GMT')).timestamp() + self.phase_length_hours * 3600
 
     def get_sorted_votes(self):
-        vote_totals = {}
-        if len(self.votes) < 1:
+        if len(self.tally) < 1:
             # If nobody voted, then everybody self voted
             for player in self.live_players:
-                self.votes[player] = player
-        for player in self.votes:
-            if self.votes[player] not in vote_totals:
-                vote_totals[self.votes[player]] = 1
-            else:
-                vote_totals[self.votes[player]] += 1
-        return sorted(vote_totals.items(), key=lambda x:x[1], reverse=True)
+                self.tally.vote(player, player)
+        return self.tally.sorted_votes()
 
     def get_game_data(self):
-        return {'game_type': self.game_type(),
+        game_data = {'game_type': self.game_type(),
                 'game_phase': self.game_phase,
                 'phase_length_hours': self.phase_length_hours,
                 'main_sub_name': self.main_sub_name,
                 'wolf_sub_name': self.wolf_sub_name,
                 'main_post_id': self.main_post_id,
                 'wolf_post_id': self.wolf_post_id,
-                'confirmed_players': self.confirmed_players,
-                'roles': self.roles,
-                'live_players': self.live_players,
-                'dead_players': self.dead_players,
                 'last_comment_time': self.last_comment_time,
-                'last_wolf_comment_time': self.last_wolf_comment_time}
+                'last_wolf_comment_time': self.last_wolf_comment_time,
+                'phase_deadline': self.phase_deadline,
+                'rng_seed': self.rng_seed,
+                'confirmations': self.confirmations.players,
+                'outbound_queue': self.outbound.pending,
+                'outbound_dropped': self.outbound.dropped}
+        game_data.update(self.state.get_game_data())
+        return game_data
 
     def get_phase_data(self):
-        return {'votes': self.votes,
+        return {'votes': self.tally.votes,
                 'actions': self.actions,
                 'wolf_kill': self.wolf_kill,
                 'wolf_killer': self.wolf_killer}
 
+    @timed
     def init_new_game(self):
-        logging.info('Posting signups in {}'.format(self.main_sub.display_name))
+        logging.info('Posting signups in %s', self.main_sub.display_name)
         signup_title = self.signup_post_title()
         signup_text = self.signup_post_text()
         signup_post = self.main_sub.submit(title=signup_title, selftext=signup_text, send_replies=False)
+        self.cache.remember_submission(signup_post)
         self.main_post_id = signup_post.id
         self.last_comment_time = signup_post.created_utc
         self.game_phase = 'signup'
+        self.record_phase_started()
 
+    @timed
     def handle_signups(self):
-        # Get comments from submission in chronological order
-        submission = self.reddit.submission(self.main_post_id)
-        submission.comments.replace_more(limit=None)
-        submission.comments_sort = "old"
-        comments = submission.comments.list()
+        # Get new comments from submission in chronological order
+        comments = fetch_new_comments(self.reddit, self.main_sub, self.main_post_id, self.last_comment_time)
+        registry.inc('hww_comments_processed_total', len(comments), thread='signup')
 
         for comment in comments:
             if comment.created_utc > self.last_comment_time:
                 player = comment.author.name.lower()
-                if '!signup' in comment.body.lower():
+                if find_command(parse_commands(comment.body), 'signup') is not None:
                     if player not in self.live_players:
                         if len(self.live_players) < self.player_limit():
-                            logging.info('Player {} has signed up for the game'.format(player))
-                            self.live_players.append(player)
-                            comment.reply('Added u/{} to the game!'.format(comment.author.name))
+                            logging.info('Player %s has signed up for the game', player)
+                            self.state.add_live(player)
+                            self.record('signup', player=player)
+                            self.outbound.reply(comment, 'Added u/{} to the game!'.format(comment.author.name))
                         else:
-                            comment.reply('Sorry, the game is full')
+                            self.outbound.reply(comment, 'Sorry, the game is full')
                     else:
-                        comment.reply('u/{} already signed up'.format(comment.author.name))
+                        self.outbound.reply(comment, 'u/{} already signed up'.format(comment.author.name))
                 self.last_comment_time = comment.created_utc
 
         if len(self.live_players) == self.player_limit():
             # lock signups
-            submission.mod.lock()
+            self.outbound.lock(self.main_post_id)
             self.game_phase = 'confirmation'
             # self.main_sub.mod.update(subreddit_type='restricted')
             # for user in self.confirmed_players:
@@ -146,202 +244,261 @@ class BaseGame:
             confirmation_post = self.main_sub.submit(title='Confirmation Phase',
                 selftext='Role PMs are being sent. Feel free to chat amongst yourselves while we wait for everyone to confirm. Game talk is not allowed.',
                 send_replies=False)
+            self.cache.remember_submission(confirmation_post)
             self.main_post_id = confirmation_post.id
             self.last_comment_time = confirmation_post.created_utc
 
+            self.record_phase_started()
+
             self.assign_roles()
+            self.state.index_roles()
+            self.record('roles_assigned', roles=dict(self.roles), rng_seed=self.rng_seed)
 
-    def handle_confirmations(self):
+    @timed
+    def handle_confirmations(self, messages=None):
         logging.debug('Sending role PMs and processing confirmations')
-
-        if len(self.live_players) > 0:
-            player = self.live_players[0]
-            logging.info('Sending role PM to {}'.format(player))
+        now = datetime.now(timezone('GMT')).timestamp()
+
+        # Role PMs that have left the outbound queue since the last tick; one it gave up on goes out again below
+        queued_keys = self.outbound.pending_keys()
+        dropped_keys = self.outbound.take_dropped()
+        for player in self.confirmations.awaiting_delivery():
+            if role_pm_key(player) in dropped_keys:
+                logging.warning('Role PM to %s could not be sent', player)
+                self.confirmations.dropped(player)
+                self.record('role_pm_dropped', player=player)
+            elif role_pm_key(player) not in queued_keys:
+                self.confirmations.sent(player, now)
+                self.record('role_pm_sent', player=player, at=now)
+
+        for player in self.confirmations.overdue(now):
+            logging.info('%s has not confirmed in time, the game will start without their confirmation', player)
+            self.confirmations.time_out(player)
+            self.record('confirmation_timed_out', player=player)
+
+        # Every PM due goes out this tick; the outbound queue paces them to the rate limit
+        for player in self.confirmations.due(self.live_players, now):
+            if self.confirmations.status(player) == PENDING:
+                logging.info('Sending role PM to %s', player)
+            else:
+                logging.info('Re-sending role PM to unconfirmed player %s', player)
             self.send_role_pm(player)
-            self.dead_players.append(player)
-            self.live_players.remove(player)
-
-        for message in self.reddit.inbox.unread():
-            if 'confirm' in message.body.lower():
-                player = message.author.name.lower()
-                logging.info('Confirmation from {}'.format(player))
-                if player in self.dead_players:
-                    message.reply('You have confirmed. The game will start once all players have confirmed.')
-                    self.confirmed_players.append(player)
-            message.mark_read()
-
-        if len(self.confirmed_players) == self.player_limit() and (time(19, 59) <= datetime.now(timezone('US/Eastern')).time() <= time(22, 59)):
-            logging.info('All players confirmed, starting game')
+            self.confirmations.queued(player, now)
+            self.record('role_pm_queued', player=player, at=now)
+
+        self.handle_inbox(messages)
+
+        if self.confirmations.settled(self.live_players) and (time(19, 59) <= datetime.now(timezone('US/Eastern')).time() <= time(22, 59)):
+            logging.info('All players confirmed or timed out, starting game')
             self.game_phase = 1
 
             # Set the wolf sub to private and add the wolves
             self.wolf_sub.mod.update(subreddit_type='private')
             logging.info('Wolf sub set to private')
-            for user in self.confirmed_players:
-                if 'Wolf' in self.roles[user]:
+            for user in self.live_players:
+                if self.state.alignments[user] == WOLF:
                     self.wolf_sub.contributor.add(user)
-                    logging.info('{} added to wolf sub'.format(user))
-                self.live_players.append(user)
-            self.dead_players = []
+                    logging.info('%s added to wolf sub', user)
+            self.record('game_started')
 
+            self.start_phase_clock()
             main_phase_post = self.main_sub.submit(title=self.phase_post_title(), selftext=self.phase_post_text({}, '', '', False), send_replies=False,)
             logging.info('Phase posted in main sub')
+            self.cache.remember_submission(main_phase_post)
             self.main_post_id = main_phase_post.id
             wolf_phase_post = self.wolf_sub.submit(title="WOLF SUB " + self.phase_post_title(), selftext=self.phase_post_text({}, '', '', True), send_replies=False)
             logging.info('Phase posted in wolf sub')
+            self.cache.remember_submission(wolf_phase_post)
             self.wolf_post_id = wolf_phase_post.id
+            self.record_phase_started()
 
-            for player in self.live_players:
-                sleep(30)
-                logging.info('Notifying {}'.format(player))
-                self.reddit.redditor(player).message('The Game Has Started', 'All players have confirmed and the game has begun in r/AutomatedWerewolves')
+            # Space the notifications out like before, but let the outbound queue do the waiting
+            for i, player in enumerate(self.live_players):
+                logging.info('Notifying %s', player)
+                self.outbound.message(player, 'The Game Has Started', 'All players have confirmed and the game has begun in r/{}'.format(self.main_sub_name), delay=30 * (i + 1))
 
+    @timed
     def handle_main_sub_comments(self):
-        logging.debug('Processing votes for Phase {}'.format(self.game_phase))
-
-        submission = self.reddit.submission(self.main_post_id)
-        submission.comments.replace_more(limit=None)
-        submission.comments_sort = "old"
-        comments = submission.comments.list()
-
+        logging.debug('Processing votes for Phase %s', self.game_phase)
+        comments = fetch_new_comments(self.reddit, self.main_sub, self.main_post_id, self.last_comment_time)
+        self.process_main_sub_comments(comments)
+
+    @timed
+    def process_main_sub_comments(self, comments):
+        """
+        Apply each player's last valid vote of the batch and send each player one reply
+        """
+
+        registry.inc('hww_comments_processed_total', len(comments), thread='main')
+        replies = ReplyBatch()
+        votes = {}
         for comment in comments:
             if comment.created_utc > self.last_comment_time:
                 self.last_comment_time = comment.created_utc
                 player = comment.author.name.lower()
                 if player not in self.live_players and player not in ['autowolfbot', 'bourboninexile']:
-                    comment.reply('Only living players are allowed to comment.')
-                    comment.mod.remove()
+                    self.outbound.reply(comment, 'Only living players are allowed to comment.')
+                    self.outbound.remove(comment)
                     continue
-                if '!vote' in comment.body.lower():
-                    logging.debug('Potential vote from {} in comment {}'.format(player, comment.body.lower()))
-                    target = ''
-                    for line in comment.body.lower().split('\n'):
-                        if '!vote' in line:
-                            parts = line.split()
-                            for i in range(len(parts)):
-                                word = parts[i]
-                                if '!vote' in word:
-                                    if i + 1 < len(parts):
-                                        if parts[i+1].startswith('/u/'):
-                                            target = parts[i+1][3:]
-                                        elif parts[i+1].startswith('u/'):
-                                            target = parts[i+1][2:]
-                                        else:
-                                            target = parts[i+1]
-                    if target in self.live_players:
-                        self.votes[player] = target
-                        comment.reply('Recorded u/{}\'s vote for u/{} for Phase {}'.format(player, target, self.game_phase))
-                        logging.info('Player {} voted for {} in Phase {}'.format(player, target, self.game_phase))
-                    else:
-                        comment.reply('u/{} is not an active player in this game'.format(target))
-                if '!table' in comment.body.lower():
-                    sorted_votes = self.get_sorted_votes()
-                    vote_table = 'Player | Votes Against | Voters\n:- | :- | :-\n'
-                    for entry in sorted_votes:
-                        voters = ''
-                        for player in self.live_players:
-                            if player in self.votes:
-                                if self.votes[player] == entry[0]:
-                                    voters += '{} '.format(player)
-                        vote_table += '{} | {} | {}\n'.format(entry[0], entry[1], voters)
-                    comment.reply(vote_table)
-
-    def handle_private_messages(self):
-        logging.debug('Processing actions for Phase {}'.format(self.game_phase))
-        for message in self.reddit.inbox.unread():
-            if '!target' in message.body.lower():
-                target = ''
-                player = message.author.name.lower()
-                if player in self.live_players:
-                    for line in message.body.lower().split('\n'):
-                        if '!target' in line:
-                            parts = line.split()
-                            for i in range(len(parts)):
-                                word = parts[i]
-                                if '!target' in word:
-                                    if i + 1 < len(parts):
-                                        if parts[i+1].startswith('/u/'):
-                                            target = parts[i+1][3:]
-                                        elif parts[i+1].startswith('u/'):
-                                            target = parts[i+1][2:]
-                                        else:
-                                            target = parts[i+1]
+                commands = parse_commands(comment.body)
+                vote = find_command(commands, 'vote')
+                if vote is not None:
+                    logging.debug('Potential vote from %s in comment %s', player, comment.body)
+                    target = vote.target
                     if target in self.live_players:
-                        logging.info('Player {}::{} targeting {}'.format(player, self.roles[player], target))
-                        self.actions[player] = target
-                        message.reply('You have targeted u/{} for Phase {}'.format(target, self.game_phase))
+                        votes[player] = target
+                        replies.add(player, comment, vote, 'Recorded u/{}\'s vote for u/{} for Phase {}'.format(player, target, self.game_phase))
                     else:
-                        message.reply('I\'m sorry, u/{} is not an active player in this game'.format(target))
+                        replies.add(player, comment, vote, 'u/{} is not an active player in this game'.format(target), accepted=False)
+                table = find_command(commands, 'table')
+                if table is not None:
+                    replies.add(player, comment, table, None)
+
+        for player, target in votes.items():
+            self.tally.vote(player, target)
+            self.record('vote', player=player, target=target)
+            logging.info('Player %s voted for %s in Phase %s', player, target, self.game_phase)
+        # Tables go out with every vote of the batch counted
+        replies.fill('table', self.tally.table)
+        replies.send(self.outbound)
+
+    @timed
+    def handle_inbox(self, messages=None):
+        """
+        Read the unread inbox once (unless the messages for this game are handed in) and
+        dispatch each item for the current phase. The items stay unread until
+        mark_inbox_read, so a tick whose save fails picks them up again after reloading.
+        """
+
+        logging.debug('Processing inbox for Phase %s', self.game_phase)
+        if messages is None:
+            messages = list(self.reddit.inbox.unread(limit=None))
+        self.process_inbox(messages)
+        self.read_messages.extend(messages)
+
+    def mark_inbox_read(self):
+        """
+        Mark the inbox items handled since the last call read in bulk (praw batches
+        mark_read 25 items per request). Call it after the tick's state is saved.
+        """
+
+        if len(self.read_messages) > 0:
+            self.reddit.inbox.mark_read(self.read_messages)
+            self.read_messages = []
+
+    @timed
+    def process_inbox(self, messages):
+        registry.inc('hww_messages_processed_total', len(messages))
+        replies = ReplyBatch()
+        actions = {}
+        for message in messages:
+            if message.author is None:
+                continue
+            if self.game_phase == 'confirmation':
+                self.handle_confirmation_message(message)
+            else:
+                self.handle_private_message(message, replies, actions)
+
+        # Only each player's last valid target of the batch counts
+        for player, target in actions.items():
+            logging.info('Player %s::%s targeting %s', player, self.roles[player], target)
+            self.actions[player] = target
+            self.record('action', player=player, target=target)
+        replies.send(self.outbound)
+
+    def handle_confirmation_message(self, message):
+        if 'confirm' in message.body.lower():
+            player = message.author.name.lower()
+            logging.info('Confirmation from %s', player)
+            # Late confirmations from timed out players still count
+            if player in self.live_players and self.confirmations.status(player) not in [PENDING, CONFIRMED]:
+                self.outbound.reply(message, 'You have confirmed. The game will start once all players have confirmed.')
+                self.confirmed_players.add(player)
+                self.confirmations.confirm(player)
+                self.record('confirmed', player=player)
+
+    def handle_private_message(self, message, replies, actions):
+        action = find_command(parse_commands(message.body), 'target')
+        if action is not None:
+            target = action.target
+            player = message.author.name.lower()
+            if player in self.live_players:
+                if target in self.live_players:
+                    actions[player] = target
+                    replies.add(player, message, action, 'You have targeted u/{} for Phase {}'.format(target, self.game_phase))
                 else:
-                    message.reply('I\'m sorry, you\'re already dead')
-            message.mark_read()
+                    replies.add(player, message, action, 'I\'m sorry, u/{} is not an active player in this game'.format(target), accepted=False)
+            else:
+                replies.add(player, message, action, 'I\'m sorry, you\'re already dead', accepted=False)
 
     def handle_commands(self):
         logging.debug('Handle in-sub commands')
 
+    @timed
     def handle_wolf_sub_comments(self):
-        logging.debug('Processing Wolf Kill for Phase {}'.format(self.game_phase))
-        submission = self.reddit.submission(self.wolf_post_id)
-        submission.comments.replace_more(limit=None)
-        submission.comments_sort = "old"
-        comments = submission.comments.list()
-
+        logging.debug('Processing Wolf Kill for Phase %s', self.game_phase)
+        comments = fetch_new_comments(self.reddit, self.wolf_sub, self.wolf_post_id, self.last_wolf_comment_time)
+        self.process_wolf_sub_comments(comments)
+
+    @timed
+    def process_wolf_sub_comments(self, comments):
+        """
+        Apply the batch's last valid kill and send each wolf one reply
+        """
+
+        registry.inc('hww_comments_processed_total', len(comments), thread='wolf')
+        replies = ReplyBatch()
+        kill_order = None
         for comment in comments:
             if comment.created_utc > self.last_wolf_comment_time:
                 self.last_wolf_comment_time = comment.created_utc
                 player = comment.author.name.lower()
                 if player not in self.live_players and player not in ['autowolfbot', 'bourboninexile']:
-                    comment.reply('Only living players are allowed to comment.')
-                    comment.mod.remove()
+                    self.outbound.reply(comment, 'Only living players are allowed to comment.')
+                    self.outbound.remove(comment)
                     continue
-                if '!kill' in comment.body.lower():
-                    logging.debug('Potential kill from {} in comment {}'.format(player, comment.body.lower()))
-                    target = ''
-                    for line in comment.body.lower().split('\n'):
-                        if '!kill' in line:
-                            parts = line.split()
-                            for i in range(len(parts)):
-                                word = parts[i]
-                                if '!kill' in word:
-                                    if i + 1 < len(parts):
-                                        if parts[i+1].startswith('/u/'):
-                                            target = parts[i+1][3:]
-                                        elif parts[i+1].startswith('u/'):
-                                            target = parts[i+1][2:]
-                                        else:
-                                            target = parts[i+1]
+                kill = find_command(parse_commands(comment.body), 'kill')
+                if kill is not None:
+                    logging.debug('Potential kill from %s in comment %s', player, comment.body)
+                    target = kill.target
                     if target in self.live_players:
-                        self.wolf_kill = target
-                        self.wolf_killer = player
-                        comment.reply('Recorded {}\'s wolf kill for {} for Phase {}'.format(player, target, self.game_phase))
-                        logging.info('Player {} submitted kill for {} in Phase {}'.format(player, target, self.game_phase))
+                        if kill_order is not None:
+                            logging.info('Superseded kill order from %s for %s', kill_order[0], kill_order[1])
+                        kill_order = (player, target)
+                        replies.add(player, comment, kill, 'Recorded {}\'s wolf kill for {} for Phase {}'.format(player, target, self.game_phase))
                     else:
-                        comment.reply('{} is not an active player in this game'.format(target))
+                        replies.add(player, comment, kill, '{} is not an active player in this game'.format(target), accepted=False)
+
+        # The wolves share one kill, so the last valid order from any of them stands
+        if kill_order is not None:
+            self.wolf_killer, self.wolf_kill = kill_order
+            self.record('wolf_kill', player=self.wolf_killer, target=self.wolf_kill)
+            logging.info('Player %s submitted kill for %s in Phase %s', self.wolf_killer, self.wolf_kill, self.game_phase)
+        replies.send(self.outbound)
 
-    def handle_turnover(self):
+    @timed
+    def handle_turnover(self, post_created_utc=None):
         logging.debug('Check for turnover')
-        main_sub_post = self.reddit.submission(self.main_post_id)
-        post_time = datetime.fromtimestamp(main_sub_post.created_utc, timezone('GMT'))
-        if datetime.now(timezone('GMT')) - post_time < timedelta(hours=self.phase_length_hours):
+        if self.phase_deadline is None:
+            # Phase was posted before deadlines were stored, so work it out from the post once
+            if post_created_utc is None:
+                post_created_utc = self.cache.submission(self.main_post_id).created_utc
+            self.phase_deadline = post_created_utc + self.phase_length_hours * 3600
+            self.record('phase_deadline', phase_deadline=self.phase_deadline)
+        if datetime.now(timezone('GMT')).timestamp() < self.phase_deadline:
             return()
 
         logging.info('Processing turnover')
         # Lock the threads in the main and wolf sub
-        main_sub_post.mod.lock()
-        wolf_sub_post = self.reddit.submission(self.wolf_post_id)
-        wolf_sub_post.mod.lock()
+        self.outbound.lock(self.main_post_id)
+        self.outbound.lock(self.wolf_post_id)
 
         sorted_votes = self.get_sorted_votes()
-        max_votes = sorted_votes[0][1]
-        tied_players = []
-        for entry in sorted_votes:
-            if entry[1] == max_votes:
-                tied_players.append(entry[0])
-        voted_out = random.choice(tied_players)
-        logging.info('Player {} has been voted out'.format(voted_out))
-        self.dead_players.append(voted_out)
-        self.live_players.remove(voted_out)
-        self.reddit.redditor(voted_out).message('You have been voted out', 'The people of the town have voted you out.')
+        tied_players = self.tally.leaders()
+        voted_out = self.rng('turnover:{}'.format(self.game_phase)).choice(sorted(tied_players))
+        logging.info('Player %s has been voted out', voted_out)
+        self.kill_player(voted_out, 'vote')
+        self.outbound.message(voted_out, 'You have been voted out', 'The people of the town have voted you out.')
 
         # Handle actions
         wolf_kill = self.process_actions()
@@ -349,21 +506,27 @@ class BaseGame:
         if self.wolf_count() > 0 and self.town_count() > self.wolf_count():
             logging.info('Neither side has won the game')
             self.game_phase += 1
+            self.start_phase_clock()
             main_phase_post = self.main_sub.submit(title=self.phase_post_title(),
                 selftext=self.phase_post_text(sorted_votes, voted_out, wolf_kill, False), send_replies=False)
+            self.cache.remember_submission(main_phase_post)
             self.main_post_id = main_phase_post.id
             wolf_phase_post = self.wolf_sub.submit(title='WOLF SUB ' + self.phase_post_title(),
                 selftext=self.phase_post_text(sorted_votes, voted_out, wolf_kill, True), send_replies=False)
+            self.cache.remember_submission(wolf_phase_post)
             self.wolf_post_id = wolf_phase_post.id
+            self.record_phase_started()
         else:
             wolves = []
             logging.info('The game is over')
             self.game_phase = 'finale'
+            self.phase_deadline = None
             self.wolf_sub.mod.update(subreddit_type='public')
-            for user in self.confirmed_players:
-                if 'Wolf' in self.roles[user]:
+            for user in self.roles:
+                if self.state.alignments[user] == WOLF:
                     self.wolf_sub.contributor.remove(user)
                     wolves.append(user)
+            self.record('game_over', winner='town' if self.wolf_count() == 0 else 'wolves')
             if self.wolf_count() == 0:
                 logging.info('The town has won')
                 finale_text = '##The Game is Over\n\n' + \
@@ -376,7 +539,7 @@ class BaseGame:
                 'The wolves {} have overrun the town and won!\n\n'.format(' and '.join(wolves)) + \
                 'The wolf sub is now open: r/{}'.format(self.wolf_sub_name)
                 finale_post = self.main_sub.submit(title='Finale', selftext=finale_text, send_replies=False)
-        self.votes = {}
+        self.tally = VoteTally()
         self.actions = {}
         self.wolf_kill = ''
         self.wolf_killer = ''
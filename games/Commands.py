@@ -0,0 +1,34 @@
+import re
+from collections import namedtuple
+
+Command = namedtuple('Command', ['name', 'target'])
+
+# A command word, anything glued to it (e.g. "!target:"), then the next word on the same line
+command_pattern = re.compile(r'!(vote|kill|target|signup|table)\S*(?:[^\S\n]+(\S+))?')
+# Leading markdown/punctuation, an optional u/ or /u/ prefix, then the username itself
+target_pattern = re.compile(r'[^a-z0-9_-]*(?:/?u/)?([a-z0-9_-]*)')
+
+def normalize_target(word):
+    return target_pattern.match(word.lower()).group(1)
+
+def parse_commands(body):
+    """
+    Tokenize a comment or message body once and return every command in it, in order
+    """
+
+    commands = []
+    for match in command_pattern.finditer(body.lower()):
+        target = '' if match.group(2) is None else normalize_target(match.group(2))
+        commands.append(Command(match.group(1), target))
+    return commands
+
+def find_command(commands, name):
+    """
+    Return the last command with the given name (the one that takes precedence), or None
+    """
+
+    found = None
+    for command in commands:
+        if command.name == name:
+            found = command
+    return found
@@ -0,0 +1,74 @@
+import logging
+from games.RedditCache import cache_for
+
+# Reddit stops paging a listing after roughly this many items
+LISTING_CAP = 1000
+
+def fetch_comment_tree(reddit, post_id, since):
+    """
+    Fetch the whole comment tree of a submission and keep the comments newer than the cursor
+    """
+
+    # The tree has to be current, and the handle is dropped once its comments are listed
+    submission = cache_for(reddit).fresh_submission(post_id)
+    submission.comments.replace_more(limit=None)
+    submission.comments_sort = "old"
+    comments = [comment for comment in submission.comments.list() if comment.created_utc > since]
+    return sorted(comments, key=lambda comment: comment.created_utc)
+
+def fetch_new_comments(reddit, subreddit, post_id, since):
+    """
+    Fetch the comments on a submission created after the cursor, oldest first
+
+    Walks the subreddit comment listing (newest first) and stops as soon as it reaches
+    the cursor, so the cost scales with new activity instead of thread size. Falls back
+    to the full comment tree when the cursor is older than the listing reaches.
+    """
+
+    link_id = 't3_' + post_id
+    fresh = []
+    seen = 0
+    for comment in subreddit.comments(limit=None):
+        if comment.created_utc <= since:
+            fresh.reverse()
+            return fresh
+        seen += 1
+        if comment.link_id == link_id:
+            fresh.append(comment)
+
+    if seen < LISTING_CAP:
+        # The listing ran out of history before the cursor, so nothing was missed
+        fresh.reverse()
+        return fresh
+
+    logging.info('Cursor %s is past the end of the r/%s comment listing, fetching the full tree of %s', since, subreddit.display_name, post_id)
+    return fetch_comment_tree(reddit, post_id, since)
+
+async def fetch_comment_tree_async(reddit, post_id, since):
+    submission = await reddit.submission(post_id)
+    await submission.comments.replace_more(limit=None)
+    comments = [comment for comment in submission.comments.list() if comment.created_utc > since]
+    return sorted(comments, key=lambda comment: comment.created_utc)
+
+async def fetch_new_comments_async(reddit, subreddit, post_id, since):
+    """
+    asyncpraw version of fetch_new_comments
+    """
+
+    link_id = 't3_' + post_id
+    fresh = []
+    seen = 0
+    async for comment in subreddit.comments(limit=None):
+        if comment.created_utc <= since:
+            fresh.reverse()
+            return fresh
+        seen += 1
+        if comment.link_id == link_id:
+            fresh.append(comment)
+
+    if seen < LISTING_CAP:
+        fresh.reverse()
+        return fresh
+
+    logging.info('Cursor %s is past the end of the r/%s comment listing, fetching the full tree of %s', since, subreddit.display_name, post_id)
+    return await fetch_comment_tree_async(reddit, post_id, since)
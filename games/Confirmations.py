@@ -0,0 +1,96 @@
+# Confirmation status of each player's role PM
+PENDING = 'pending'
+QUEUED = 'queued'
+SENT = 'sent'
+CONFIRMED = 'confirmed'
+TIMED_OUT = 'timed_out'
+
+# Unconfirmed players get their role PM again after this long...
+RESEND_HOURS = 12
+# ...and the game starts without their confirmation after this long
+TIMEOUT_HOURS = 24
+
+def role_pm_key(player):
+    """
+    Outbound queue key of a player's role PM
+    """
+
+    return 'role_pm:{}'.format(player)
+
+class Confirmations:
+    """
+    Role PM delivery and confirmation status per player, kept in the game data
+
+    Every role PM is queued at once and the outbound queue sends them as fast as the
+    rate limit allows. A queued PM counts as sent once it has left the queue, unless the
+    queue gave up on it, which puts the player back to pending. Players who haven't
+    confirmed get the PM again after RESEND_HOURS, and are timed out TIMEOUT_HOURS after
+    the first send (or the first queueing, if it never got out). A player with no entry is
+    still pending, so a game can pick this up at any point of the confirmation phase.
+    """
+
+    def __init__(self, players=None):
+        # player -> {'status', 'sends', 'first_queued', 'first_sent', 'last_sent'}
+        self.players = {} if players is None else players
+
+    def status(self, player):
+        return PENDING if player not in self.players else self.players[player]['status']
+
+    def entry(self, player):
+        if player not in self.players:
+            self.players[player] = {'status': PENDING, 'sends': 0, 'first_queued': None, 'first_sent': None, 'last_sent': None}
+        return self.players[player]
+
+    def queued(self, player, at=None):
+        entry = self.entry(player)
+        entry['status'] = QUEUED
+        entry['sends'] += 1
+        if entry.get('first_queued') is None:
+            entry['first_queued'] = at
+
+    def dropped(self, player):
+        self.entry(player)['status'] = PENDING
+
+    def sent(self, player, at):
+        entry = self.entry(player)
+        entry['status'] = SENT
+        entry['first_sent'] = at if entry['first_sent'] is None else entry['first_sent']
+        entry['last_sent'] = at
+
+    def confirm(self, player):
+        self.entry(player)['status'] = CONFIRMED
+
+    def time_out(self, player):
+        self.entry(player)['status'] = TIMED_OUT
+
+    def awaiting_delivery(self):
+        return [player for player, entry in self.players.items() if entry['status'] == QUEUED]
+
+    def overdue(self, now):
+        overdue = []
+        for player, entry in self.players.items():
+            if entry['status'] == SENT:
+                since = entry['first_sent']
+            elif entry['status'] == QUEUED:
+                # A PM stuck in the queue doesn't hold the game up for longer than a sent one
+                since = entry.get('first_queued')
+            else:
+                continue
+            if since is not None and now - since >= TIMEOUT_HOURS * 3600:
+                overdue.append(player)
+        return overdue
+
+    def due(self, players, now):
+        """
+        Players whose role PM should be queued now: never sent, or sent too long ago without a confirmation
+        """
+
+        due = []
+        for player in players:
+            status = self.status(player)
+            if status == PENDING or (status == SENT and now - self.players[player]['last_sent'] >= RESEND_HOURS * 3600):
+                due.append(player)
+        return due
+
+    def settled(self, players):
+        return all(self.status(player) in [CONFIRMED, TIMED_OUT] for player in players)
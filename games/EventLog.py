@@ -0,0 +1,97 @@
+import copy
+from games.Confirmations import Confirmations
+
+# Every state transition BaseGame makes is recorded as one of these events. A snapshot
+# is {'game': game data, 'phase': phase data} in the same shape the state server
+# stores, so replaying events on top of a snapshot rebuilds the stored documents.
+
+def empty_state():
+    return {'game': {}, 'phase': {}}
+
+def remove_player(players, player):
+    if player in players:
+        players.remove(player)
+
+def add_player(players, player):
+    if player not in players:
+        players.append(player)
+
+def apply(state, event):
+    """
+    Apply one event to a snapshot in place
+    """
+
+    game = state['game']
+    phase = state['phase']
+    event_type = event['type']
+    if event_type == 'phase_started':
+        for field in ['game_phase', 'main_post_id', 'wolf_post_id', 'phase_deadline', 'last_comment_time', 'last_wolf_comment_time']:
+            if field in event:
+                game[field] = event[field]
+        state['phase'] = {'votes': {}, 'actions': {}, 'wolf_kill': '', 'wolf_killer': ''}
+    elif event_type == 'signup':
+        add_player(game.setdefault('live_players', []), event['player'])
+    elif event_type == 'roles_assigned':
+        game['roles'] = dict(event['roles'])
+        game['rng_seed'] = event['rng_seed']
+    elif event_type == 'role_pm_queued':
+        Confirmations(game.setdefault('confirmations', {})).queued(event['player'], event.get('at'))
+    elif event_type == 'role_pm_dropped':
+        Confirmations(game.setdefault('confirmations', {})).dropped(event['player'])
+    elif event_type == 'role_pm_sent':
+        if 'at' in event:
+            # Players stay alive while they confirm; this also undoes the old marker below
+            remove_player(game.setdefault('dead_players', []), event['player'])
+            add_player(game.setdefault('live_players', []), event['player'])
+            Confirmations(game.setdefault('confirmations', {})).sent(event['player'], event['at'])
+        else:
+            # Logged before Confirmations: a sent role PM moved the player to the dead list
+            remove_player(game.setdefault('live_players', []), event['player'])
+            add_player(game.setdefault('dead_players', []), event['player'])
+    elif event_type == 'confirmed':
+        add_player(game.setdefault('confirmed_players', []), event['player'])
+        Confirmations(game.setdefault('confirmations', {})).confirm(event['player'])
+    elif event_type == 'confirmation_timed_out':
+        Confirmations(game.setdefault('confirmations', {})).time_out(event['player'])
+    elif event_type == 'game_started':
+        live_players = game.setdefault('live_players', [])
+        for player in game.get('confirmed_players', []):
+            add_player(live_players, player)
+        game['dead_players'] = []
+    elif event_type == 'vote':
+        phase.setdefault('votes', {})[event['player']] = event['target']
+    elif event_type == 'action':
+        phase.setdefault('actions', {})[event['player']] = event['target']
+    elif event_type == 'wolf_kill':
+        phase['wolf_kill'] = event['target']
+        phase['wolf_killer'] = event['player']
+    elif event_type == 'killed':
+        remove_player(game.setdefault('live_players', []), event['player'])
+        add_player(game.setdefault('dead_players', []), event['player'])
+    elif event_type == 'role_changed':
+        game.setdefault('roles', {})[event['player']] = event['role']
+    elif event_type == 'phase_deadline':
+        game['phase_deadline'] = event['phase_deadline']
+    elif event_type == 'cursor':
+        game['last_comment_time'] = event['last_comment_time']
+        game['last_wolf_comment_time'] = event['last_wolf_comment_time']
+    elif event_type == 'game_over':
+        game['game_phase'] = 'finale'
+        game['phase_deadline'] = None
+        game['winner'] = event['winner']
+        state['phase'] = {}
+    else:
+        raise Exception('Unknown event type {}'.format(event_type))
+
+def replay(snapshot, events):
+    """
+    Return the state after applying events, in order, to a copy of the snapshot
+
+    Pure and deterministic: events carry outcomes (roles dealt, who was voted out)
+    rather than re-running any random choices.
+    """
+
+    state = copy.deepcopy(snapshot)
+    for event in events:
+        apply(state, event)
+    return state
@@ -0,0 +1,117 @@
+WOLF = 'wolf'
+TOWN = 'town'
+
+def alignment_of(role):
+    if 'Wolf' in role:
+        return WOLF
+    if 'Town' in role:
+        return TOWN
+    return None
+
+class PlayerSet:
+    """
+    Insertion-ordered set of player names
+
+    Membership tests and removals are O(1) like a set, while iteration keeps the
+    order players joined in so posts and stored state look the same as with lists.
+    """
+
+    __slots__ = ('members',)
+
+    def __init__(self, players=()):
+        self.members = dict.fromkeys(players)
+
+    def __contains__(self, player):
+        return player in self.members
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def __len__(self):
+        return len(self.members)
+
+    def add(self, player):
+        self.members[player] = None
+
+    def remove(self, player):
+        del self.members[player]
+
+    def discard(self, player):
+        self.members.pop(player, None)
+
+    def clear(self):
+        self.members.clear()
+
+    def first(self):
+        return next(iter(self.members))
+
+    def to_list(self):
+        return list(self.members)
+
+class GameState:
+    """
+    Rosters, roles and alignments for one game
+
+    Each player's alignment is worked out once when roles are indexed, and the
+    number of living wolves and townies is kept up to date as players join and
+    die, so win checks don't rescan every role name.
+    """
+
+    __slots__ = ('roles', 'alignments', 'live_players', 'dead_players', 'confirmed_players', 'live_wolves', 'live_town')
+
+    def __init__(self, roles=None, live_players=(), dead_players=(), confirmed_players=()):
+        self.roles = {} if roles is None else roles
+        self.live_players = PlayerSet(live_players)
+        self.dead_players = PlayerSet(dead_players)
+        self.confirmed_players = PlayerSet(confirmed_players)
+        self.index_roles()
+
+    @classmethod
+    def from_game_data(cls, game_data):
+        return cls({} if 'roles' not in game_data else game_data['roles'],
+                   [] if 'live_players' not in game_data else game_data['live_players'],
+                   [] if 'dead_players' not in game_data else game_data['dead_players'],
+                   [] if 'confirmed_players' not in game_data else game_data['confirmed_players'])
+
+    def get_game_data(self):
+        return {'confirmed_players': self.confirmed_players.to_list(),
+                'roles': self.roles,
+                'live_players': self.live_players.to_list(),
+                'dead_players': self.dead_players.to_list()}
+
+    def index_roles(self):
+        """
+        Recompute alignments and living counts from the roles, after roles are assigned or loaded
+        """
+
+        self.alignments = dict((player, alignment_of(role)) for player, role in self.roles.items())
+        self.live_wolves = 0
+        self.live_town = 0
+        for player in self.live_players:
+            self.count(player, 1)
+
+    def count(self, player, change):
+        alignment = self.alignments.get(player)
+        if alignment == WOLF:
+            self.live_wolves += change
+        elif alignment == TOWN:
+            self.live_town += change
+
+    def set_role(self, player, role):
+        if player in self.live_players:
+            self.count(player, -1)
+        self.roles[player] = role
+        self.alignments[player] = alignment_of(role)
+        if player in self.live_players:
+            self.count(player, 1)
+
+    def add_live(self, player):
+        self.dead_players.discard(player)
+        if player not in self.live_players:
+            self.live_players.add(player)
+            self.count(player, 1)
+
+    def kill_player(self, player):
+        self.live_players.remove(player)
+        self.dead_players.add(player)
+        self.count(player, -1)
@@ -0,0 +1,115 @@
+import functools
+import threading
+import time
+
+class Metrics:
+    """
+    Thread-safe counters, gauges and timing summaries in the Prometheus data model
+
+    The bot records into the module-level `registry` and periodically pushes what it
+    has gathered to the state server with take(); the server merge()s the pushes into
+    its own registry and serves render() at /metrics.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        # (name, labels) -> [count, sum]
+        self.summaries = {}
+
+    def key(self, name, labels):
+        return (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+
+    def inc(self, name, value=1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.gauges[key] = value
+
+    def observe(self, name, seconds, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            summary = self.summaries.setdefault(key, [0, 0.0])
+            summary[0] += 1
+            summary[1] += seconds
+
+    def take(self):
+        """
+        Return everything recorded since the last take() as JSON-friendly lists, and reset
+        """
+
+        with self.lock:
+            snapshot = {'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                        'gauges': [[name, list(labels), value] for (name, labels), value in self.gauges.items()],
+                        'summaries': [[name, list(labels), count, total] for (name, labels), (count, total) in self.summaries.items()]}
+            self.counters = {}
+            self.gauges = {}
+            self.summaries = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """
+        Add a take() snapshot into this registry: counters and summaries accumulate, gauges are replaced
+        """
+
+        with self.lock:
+            for name, labels, value in snapshot.get('counters', []):
+                key = (name, tuple(tuple(label) for label in labels))
+                self.counters[key] = self.counters.get(key, 0) + value
+            for name, labels, value in snapshot.get('gauges', []):
+                self.gauges[(name, tuple(tuple(label) for label in labels))] = value
+            for name, labels, count, total in snapshot.get('summaries', []):
+                summary = self.summaries.setdefault((name, tuple(tuple(label) for label in labels)), [0, 0.0])
+                summary[0] += count
+                summary[1] += total
+
+    def render(self):
+        """
+        Prometheus text exposition format
+        """
+
+        with self.lock:
+            series = [(name, 'counter', labels, '', value) for (name, labels), value in self.counters.items()]
+            series += [(name, 'gauge', labels, '', value) for (name, labels), value in self.gauges.items()]
+            for (name, labels), (count, total) in self.summaries.items():
+                series.append((name, 'summary', labels, '_count', count))
+                series.append((name, 'summary', labels, '_sum', total))
+
+        lines = []
+        typed = set()
+        for name, metric_type, labels, suffix, value in sorted(series):
+            if name not in typed:
+                lines.append('# TYPE {} {}'.format(name, metric_type))
+                typed.add(name)
+            lines.append('{}{}{} {}'.format(name, suffix, format_labels(labels), value))
+        return '\n'.join(lines) + '\n'
+
+def format_labels(labels):
+    if len(labels) < 1:
+        return ''
+    escaped = ['{}="{}"'.format(label, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for label, value in labels]
+    return '{' + ','.join(escaped) + '}'
+
+registry = Metrics()
+
+def timed(handler):
+    """
+    Decorator recording a game handler's latency and failures
+    """
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return handler(*args, **kwargs)
+        except:
+            registry.inc('hww_handler_errors_total', handler=handler.__name__)
+            raise
+        finally:
+            registry.observe('hww_handler_seconds', time.perf_counter() - start, handler=handler.__name__)
+    return wrapper
@@ -0,0 +1,115 @@
+import logging
+from games.GameState import TOWN, WOLF
+
+# Night actions resolve in this order. Roles that aren't listed here (like
+# 'bulletproof') are passive and only come into play when they are targeted.
+ACTION_PRIORITIES = {'block': 10,
+                     'jail': 20,
+                     'protect': 30,
+                     'inspect': 40,
+                     'track': 50,
+                     'kill': 60}
+
+# Effects an action leaves on its target
+ACTION_EFFECTS = {'block': ('blocked',),
+                  'jail': ('blocked', 'jailed', 'protected'),
+                  'protect': ('protected',)}
+
+# Role a bulletproof player is left with once the wolves have used up their vest
+SPENT_BULLETPROOF_ROLE = 'Vanilla Town'
+
+class NightResult:
+    """
+    Everything a night's actions did, for the game to apply to its state
+    """
+
+    __slots__ = ('messages', 'role_changes', 'deaths')
+
+    def __init__(self):
+        self.messages = []
+        self.role_changes = {}
+        self.deaths = []
+
+    def message(self, player, subject, text):
+        self.messages.append((player, subject, text))
+
+def stopped(action_type, effects):
+    # A roleblock stops role actions, but only jailing the wolf who submitted the kill stops the kill
+    if action_type == 'kill':
+        return 'jailed' in effects
+    return 'blocked' in effects
+
+def resolve_night(state, actions, night_roles, wolf_killer='', wolf_kill=''):
+    """
+    Resolve a night in one ordered pass and return a NightResult
+
+    `state` is the game's GameState, `actions` maps each player to the target they
+    submitted, and `night_roles` maps role names to one of the ACTION_PRIORITIES
+    action types (or 'bulletproof'). Nothing is changed here; the caller applies
+    the result.
+    """
+
+    result = NightResult()
+
+    # (actor, action type, target) for every action that could go through. The wolf who
+    # submitted the kill keeps their own role action too, so this can't be keyed by actor.
+    submitted = []
+    for actor, target in actions.items():
+        action_type = night_roles.get(state.roles.get(actor))
+        if action_type in ACTION_PRIORITIES and actor in state.live_players and len(target) > 0:
+            submitted.append((actor, action_type, target))
+    if wolf_killer in state.live_players and len(wolf_kill) > 0:
+        submitted.append((wolf_killer, 'kill', wolf_kill))
+
+    # actor -> (action type, target) a tracker sees; the kill wins over the killer's own action
+    tracked_actions = dict((actor, (action_type, target)) for actor, action_type, target in submitted)
+
+    # target -> set of effects applied so far
+    effects = {}
+    order = sorted(submitted, key=lambda action: ACTION_PRIORITIES[action[1]])
+    for actor, action_type, target in order:
+        role = state.roles.get(actor)
+        if stopped(action_type, effects.get(actor, ())):
+            logging.info('The %s %s was stopped from targeting %s', role, actor, target)
+            if action_type in ('inspect', 'track'):
+                result.message(actor, 'Action Failed', 'Your action has failed')
+            continue
+
+        if action_type in ACTION_EFFECTS:
+            logging.info('The %s %s used %s on %s', role, actor, action_type, target)
+            effects.setdefault(target, set()).update(ACTION_EFFECTS[action_type])
+
+        elif action_type == 'inspect':
+            alignment = state.alignments.get(target)
+            if alignment == WOLF:
+                logging.info('The %s %s has seen the wolf %s', role, actor, target)
+                result.message(actor, 'Seer Result', '{} is a Wolf'.format(target))
+            elif alignment == TOWN:
+                logging.info('The %s %s has seen the townie %s', role, actor, target)
+                result.message(actor, 'Seer Result', '{} is Town'.format(target))
+            else:
+                logging.info('The %s %s has failed', role, actor)
+                result.message(actor, 'Action Failed', 'Your action has failed')
+
+        elif action_type == 'track':
+            tracked = tracked_actions.get(target)
+            if tracked is not None and not stopped(tracked[0], effects.get(target, ())):
+                logging.info('The %s %s has seen %s target %s', role, actor, target, tracked[1])
+                result.message(actor, 'Tracker Result', '{}\'s Night Action target was {}'.format(target, tracked[1]))
+            else:
+                logging.info('The %s %s did not see %s target anyone', role, actor, target)
+                result.message(actor, 'Tracker Result', '{} did not take a Night Action'.format(target))
+
+        elif action_type == 'kill':
+            if target not in state.live_players or 'protected' in effects.get(target, ()):
+                logging.info('The wolves failed to kill %s', target)
+            elif night_roles.get(state.roles.get(target)) == 'bulletproof' and target not in result.role_changes:
+                logging.info('The wolves have hit the %s %s', state.roles.get(target), target)
+                result.role_changes[target] = SPENT_BULLETPROOF_ROLE
+                result.message(target, 'Close Call', 'The wolves nearly got you. That was close. You are now {}'.format(SPENT_BULLETPROOF_ROLE))
+            else:
+                logging.info('The wolves have killed %s', target)
+                result.deaths.append(target)
+                result.message(target, 'You Have Been Killed', 'You keep running but the howling keeps getting closer. You have been killed by the wolves.')
+
+    return result
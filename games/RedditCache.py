@@ -0,0 +1,94 @@
+import threading
+import weakref
+from collections import OrderedDict
+from games.Metrics import registry
+
+DEFAULT_CAPACITY = 512
+
+class RedditCache:
+    """
+    LRU cache of praw Submission and Redditor handles for one Reddit client
+
+    praw objects are lazy: the first access to a field fetches the whole object, and a
+    new handle for the same id fetches it again. Reusing handles means a post's fields
+    are fetched once per process instead of once per use. Anything that has to be
+    current (a comment tree, say) goes through fresh_submission, which hands out a new
+    handle without caching it, so a loaded comment forest isn't pinned. Reusing a
+    handle that had already been fetched counts as a fetch avoided.
+    """
+
+    def __init__(self, reddit, capacity=DEFAULT_CAPACITY):
+        self.reddit = reddit
+        self.capacity = capacity
+        self.handles = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fetches_avoided = 0
+
+    def get(self, kind, key, factory):
+        with self.lock:
+            handle = self.handles.get((kind, key))
+            if handle is not None:
+                self.handles.move_to_end((kind, key))
+                self.hits += 1
+                registry.inc('hww_reddit_cache_total', kind=kind, result='hit')
+                if getattr(handle, '_fetched', False):
+                    self.fetches_avoided += 1
+                    registry.inc('hww_reddit_fetches_avoided_total', kind=kind)
+                return handle
+            self.misses += 1
+            registry.inc('hww_reddit_cache_total', kind=kind, result='miss')
+            handle = factory(key)
+            self.store(kind, key, handle)
+            return handle
+
+    def store(self, kind, key, handle):
+        # Callers hold the lock
+        self.handles[(kind, key)] = handle
+        self.handles.move_to_end((kind, key))
+        while len(self.handles) > self.capacity:
+            self.handles.popitem(last=False)
+
+    def submission(self, submission_id):
+        return self.get('submission', submission_id, self.reddit.submission)
+
+    def redditor(self, name):
+        return self.get('redditor', name.lower(), self.reddit.redditor)
+
+    def remember_submission(self, submission):
+        """
+        Keep a handle we already have, like the one submit() returns
+        """
+
+        with self.lock:
+            self.store('submission', submission.id, submission)
+
+    def fresh_submission(self, submission_id):
+        """
+        A new handle that is never cached, so its next field access fetches fresh data
+
+        Use it for the comment tree: a handle holds on to every comment it has loaded,
+        and a cached one would keep whole threads in memory until it's evicted.
+        """
+
+        return self.reddit.submission(submission_id)
+
+    def invalidate(self, kind, key):
+        with self.lock:
+            self.handles.pop((kind, key), None)
+
+caches = weakref.WeakKeyDictionary()
+caches_lock = threading.Lock()
+
+def cache_for(reddit):
+    """
+    The process-wide RedditCache of a Reddit client (handles can't be shared between clients)
+    """
+
+    with caches_lock:
+        cache = caches.get(reddit)
+        if cache is None:
+            cache = RedditCache(reddit)
+            caches[reddit] = cache
+        return cache
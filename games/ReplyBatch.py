@@ -0,0 +1,56 @@
+import logging
+from games.Metrics import registry
+
+class ReplyBatch:
+    """
+    A tick's acknowledgements, gathered per player so each player gets one reply
+
+    A player's later command of a type supersedes the earlier one: only its
+    acknowledgement is kept (the earlier command is logged), and the reply goes to the
+    player's latest comment or message that had a kept command in it. A rejected command
+    doesn't supersede an accepted one, since the accepted one still stands, so the reply
+    always matches what the game applied. However many commands a player spams between
+    ticks, they cost one reply.
+    """
+
+    def __init__(self):
+        # player -> [thing to reply to, {command name: (command, text, accepted)}]
+        self.replies = {}
+
+    def add(self, player, thing, command, text, accepted=True):
+        """
+        Acknowledge a command; text may be None if it's filled in later with fill()
+        """
+
+        if player not in self.replies:
+            self.replies[player] = [thing, {}]
+        reply = self.replies[player]
+        if command.name in reply[1]:
+            standing, _, standing_accepted = reply[1][command.name]
+            if standing_accepted and not accepted:
+                logging.info('Ignored rejected !%s %s from %s, !%s %s stands', command.name, command.target, player, standing.name, standing.target)
+                return
+            logging.info('Superseded !%s %s from %s with !%s %s', standing.name, standing.target, player, command.name, command.target)
+            registry.inc('hww_commands_superseded_total', command=command.name)
+            # Keep the acknowledgements in the order the player last gave each command
+            del reply[1][command.name]
+        reply[0] = thing
+        reply[1][command.name] = (command, text, accepted)
+
+    def fill(self, name, make_text):
+        """
+        Set the text of every acknowledgement of one command, computing it only if there are any
+        """
+
+        text = None
+        for thing, acknowledgements in self.replies.values():
+            if name in acknowledgements:
+                if text is None:
+                    text = make_text()
+                command, _, accepted = acknowledgements[name]
+                acknowledgements[name] = (command, text, accepted)
+
+    def send(self, outbound):
+        for thing, acknowledgements in self.replies.values():
+            outbound.reply(thing, '\n\n'.join(text for command, text, accepted in acknowledgements.values()))
+        return len(self.replies)
@@ -0,0 +1,68 @@
+class VoteTally:
+    """
+    Running vote count for a phase
+
+    Keeps voter -> target, target -> voters and count -> targets maps up to date on
+    every vote, so changing a vote is O(1) and the leaderboard and the rendered
+    !table markdown never need a full recount. The table is cached until a vote changes.
+    """
+
+    def __init__(self, votes=None):
+        self.votes = {}
+        # Dicts with None values are used as insertion-ordered sets
+        self.voters = {}
+        self.buckets = {}
+        self.table_cache = None
+        if votes is not None:
+            for voter, target in votes.items():
+                self.vote(voter, target)
+
+    def __len__(self):
+        return len(self.votes)
+
+    def count(self, target):
+        return len(self.voters.get(target, {}))
+
+    def move(self, target, old_count, new_count):
+        if old_count > 0:
+            del self.buckets[old_count][target]
+            if len(self.buckets[old_count]) < 1:
+                del self.buckets[old_count]
+        if new_count > 0:
+            self.buckets.setdefault(new_count, {})[target] = None
+
+    def vote(self, voter, target):
+        previous = self.votes.get(voter)
+        if previous == target:
+            return
+        if previous is not None:
+            previous_count = self.count(previous)
+            del self.voters[previous][voter]
+            if len(self.voters[previous]) < 1:
+                del self.voters[previous]
+            self.move(previous, previous_count, previous_count - 1)
+        self.votes[voter] = target
+        target_count = self.count(target)
+        self.voters.setdefault(target, {})[voter] = None
+        self.move(target, target_count, target_count + 1)
+        self.table_cache = None
+
+    def sorted_votes(self):
+        """
+        [(target, votes)] from most to fewest votes
+        """
+
+        return [(target, count) for count in sorted(self.buckets, reverse=True) for target in self.buckets[count]]
+
+    def leaders(self):
+        if len(self.buckets) < 1:
+            return []
+        return list(self.buckets[max(self.buckets)])
+
+    def table(self):
+        if self.table_cache is None:
+            vote_table = 'Player | Votes Against | Voters\n:- | :- | :-\n'
+            for target, count in self.sorted_votes():
+                vote_table += '{} | {} | {} \n'.format(target, count, ' '.join(self.voters[target]))
+            self.table_cache = vote_table
+        return self.table_cache
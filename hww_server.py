@@ -1,138 +1,397 @@
 import datetime
 import logging
-from logging.handlers import TimedRotatingFileHandler
+from LogPipeline import TICK_HEADER, current_tick, setup_logging
 
-handlers = set()
-handlers.add(TimedRotatingFileHandler('HWWGameBot.log', when='W0', backupCount=4))
-logging.basicConfig(level=logging.INFO, handlers=handlers, format='%(asctime)s %(levelname)s %(module)s:%(funcName)s %(message)s')
-logging.Formatter.formatTime = (lambda self, record, datefmt=None: datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).astimezone().isoformat(sep="T",timespec="milliseconds"))
+# Run as a script it's the only server process; under a WSGI server each worker logs to its own file
+setup_logging('server', per_process=__name__ != '__main__')
 
 import json
-import os
 import sys
-from flask import abort, Flask, jsonify, request
+import threading
+import time
+from flask import abort, Flask, g, jsonify, request, Response
+from werkzeug.http import quote_etag
 from werkzeug.serving import WSGIRequestHandler
+from StateStore import StateStore, VersionConflict
+from games.EventLog import empty_state, replay
+from games.Metrics import Metrics
 
 #https://stackoverflow.com/questions/54141751/how-to-disable-flask-app-run-s-default-message
 cli = sys.modules['flask.cli']
 cli.show_server_banner = lambda *x: None
 
+# Production: gunicorn -w 4 -b 0.0.0.0:8800 hww_server:app
+# Each worker opens the store on its first request; they all share the one database file.
 app = Flask(__name__)
 
-class JsonHelper:
-    def ascii_encode_dict(self, data):
-        ascii_encode = lambda x: x.encode('ascii') if isinstance(x, str) else x
-        return dict(map(ascii_encode, pair) for pair in data.items())
+# Specify data file names
+state_db_fname = 'database/state.db'
+active_game_fname = 'database/active_game.json'
+active_phase_fname = 'database/active_phase.json'
 
-    def get_db(self, fname, encode_ascii=True):
-        with open(fname) as json_data:
-            if encode_ascii:
-                data = json.load(json_data, object_hook=self.ascii_encode_dict)
-            else:
-                data = json.load(json_data)
-        return data
+# Game and phase documents live in SQLite, opened by open_store()
+store = None
+store_lock = threading.Lock()
 
-    def dump(self, db, fname):
-        with open(fname, 'w') as outfile:
-            outfile.write(str(db).replace("'", '"').replace('{u"', '{"').replace('[u"', '["').replace(' u"', ' "'))
+# The un-prefixed routes (/game-data/ etc.) address this game
+default_game_id = 'default'
 
-json_helper = JsonHelper()
+# This process's own metrics, added into the store's shared totals every so often
+metrics = Metrics()
+metrics_flush_seconds = 10
+metrics_flushed = time.time()
 
-# Specify data file names
-active_game_fname = 'database/active_game.json'
-active_phase_fname = 'database/active_phase.json'
+# Take a fresh snapshot of a game's event log once this many events have piled up after the last one
+snapshot_interval = 200
+
+def document_etag(doc, version):
+    return '{}-{}'.format(doc, version)
+
+def conditional_get(doc):
+    """
+    Answer a GET with 304 when the client already holds the current version
+    """
 
-# Declare data file structures
-active_game = {}
-active_phase = {}
+    version, modified, data = store.read([doc])[doc]
+    etag = document_etag(doc, version)
+    last_modified = datetime.datetime.fromtimestamp(int(modified), datetime.timezone.utc)
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        # Last-Modified only has whole seconds and a document is often written twice in one,
+        # so only a document last written before that second is known to be unchanged
+        not_modified = request.if_modified_since is not None and modified < request.if_modified_since.timestamp()
+    if not_modified:
+        response = Response(status=304)
+    else:
+        response = jsonify(data)
+    metrics.inc('hww_state_reads_total', status=response.status_code)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response
+
+@app.before_request
+def ensure_store():
+    if store is None:
+        open_store()
+
+@app.before_request
+def join_tick():
+    # Log under the bot's tick id when the request was made during a tick
+    tick_id = request.headers.get(TICK_HEADER)
+    if tick_id is not None:
+        g.tick_token = current_tick.set({'tick_id': tick_id, 'game_id': request.view_args.get('game_id') if request.view_args else None})
+
+@app.teardown_request
+def leave_tick(error=None):
+    if 'tick_token' in g:
+        current_tick.reset(g.tick_token)
 
-@app.route('/new-game/', methods=['POST'])
-def reset_game():
+@app.after_request
+def flush_metrics_periodically(response):
+    global metrics_flushed
+    if time.time() - metrics_flushed >= metrics_flush_seconds:
+        metrics_flushed = time.time()
+        store.merge_metrics(metrics.take())
+    return response
+
+def expected_versions(docs):
     """
-    Reset the HWW game
+    The version of each of the documents the request's If-Match holds an ETag for
     """
 
-    global active_game
-    global active_phase
+    expected = {}
+    for etag in request.if_match.as_set():
+        doc, _, version = etag.rpartition('-')
+        if doc in docs and version.isdigit():
+            expected[doc] = int(version)
+    return expected
+
+def conflict(error):
+    # The client's copy is out of date, so it has to reload before writing again
+    logging.warning('Rejected a write based on a stale copy: %s', error)
+    metrics.inc('hww_state_write_conflicts_total', doc=error.doc.rpartition('/')[2])
+    return Response(status=412)
+
+def write_document(doc, replace):
+    try:
+        return written(doc, store.write([(doc, read_json_form(), replace)], expected_versions([doc]))[0])
+    except VersionConflict as error:
+        return conflict(error)
+
+def written(doc, version):
+    # Only the new ETag, so a write costs the size of what was sent rather than of the whole document
+    etag = document_etag(doc, version)
+    response = jsonify({'etag': quote_etag(etag)})
+    response.set_etag(etag)
+    return response
+
+def read_json_form():
+    data = json.loads(request.form['json'])
+    if isinstance(data, str):
+        data = json.loads(data)
+    return data
+
+def game_doc(game_id):
+    return '{}/game'.format(game_id)
+
+def phase_doc(game_id):
+    return '{}/phase'.format(game_id)
+
+@app.route('/games/', methods=['GET'])
+def list_games():
+    """
+    List the games that are still running (or every game with ?all=1)
+    """
+
+    include_finished = request.args.get('all', '0') == '1'
+    game_types = store.field_values('game_type', '/game')
+    game_phases = store.field_values('game_phase', '/game')
+    games = []
+    for doc in sorted(game_types):
+        game_phase = game_phases.get(doc, 'init')
+        if include_finished or game_phase != 'finale':
+            games.append({'game_id': doc[:-len('/game')], 'game_type': game_types[doc], 'game_phase': game_phase})
+    return(jsonify(games))
+
+@app.route('/new-game/', defaults={'game_id': default_game_id}, methods=['POST'])
+@app.route('/games/<game_id>/new-game/', methods=['POST'])
+def reset_game(game_id):
+    """
+    Reset (or create) an HWW game, optionally with starting settings like the subs to use
+    """
 
     if request.method == 'POST':
         active_game = {'game_type': 'matrix6'}
-        json_helper.dump(active_game, active_game_fname)
-        active_phase = {}
-        json_helper.dump(active_phase, active_phase_fname)
+        if 'json' in request.form:
+            active_game.update(read_json_form())
+        # One transaction, so a tick saved meanwhile can't land between the writes
+        with store.transaction():
+            store.replace(game_doc(game_id), active_game)
+            store.replace(phase_doc(game_id), {})
+            # The event log starts over from the new game's settings
+            store.clear_events(game_id)
+            store.save_snapshot(game_id, 0, {'game': active_game, 'phase': {}})
         return(jsonify(active_game))
     else:
         logging.error('DAFUQ request')
         abort(400)
 
 
-@app.route('/phase-data/', methods=['GET', 'POST'])
-def phase_data():
+@app.route('/phase-data/', defaults={'game_id': default_game_id}, methods=['GET', 'POST', 'PATCH'])
+@app.route('/games/<game_id>/phase-data/', methods=['GET', 'POST', 'PATCH'])
+def phase_data(game_id):
     """
     Storage and retrieval for phase-level data
-    """
 
-    global active_phase
-    logging.debug('Current phase data: {}'.format(active_phase))
+    POST replaces the whole document, PATCH only updates the fields it is given. Either
+    answers 412 when If-Match names a version of the document that is no longer current.
+    """
 
+    doc = phase_doc(game_id)
     if request.method == 'GET':
-        return(jsonify(active_phase))
+        return(conditional_get(doc))
     elif request.method == 'POST':
-        active_phase = request.form['json']
-        json_helper.dump(active_phase, active_phase_fname)
-        return(jsonify(active_phase))
+        return(write_document(doc, True))
+    elif request.method == 'PATCH':
+        return(write_document(doc, False))
     else:
         logging.error('DAFUQ request')
         abort(400)
 
-@app.route('/game-data/', methods=['GET', 'POST'])
-def game_config():
+@app.route('/game-data/', defaults={'game_id': default_game_id}, methods=['GET', 'POST', 'PATCH'])
+@app.route('/games/<game_id>/game-data/', methods=['GET', 'POST', 'PATCH'])
+def game_config(game_id):
     """
     Storage and retrieval for game-level data
+
+    POST replaces the whole document, PATCH only updates the fields it is given. Either
+    answers 412 when If-Match names a version of the document that is no longer current.
+    """
+
+    doc = game_doc(game_id)
+    if request.method == 'GET':
+        return(conditional_get(doc))
+    elif request.method == 'POST':
+        return(write_document(doc, True))
+    elif request.method == 'PATCH':
+        return(write_document(doc, False))
+    else:
+        logging.error('DAFUQ request')
+        abort(400)
+
+@app.route('/tick-state/', defaults={'game_id': default_game_id}, methods=['GET', 'POST'])
+@app.route('/games/<game_id>/tick-state/', methods=['GET', 'POST'])
+def tick_state(game_id):
     """
+    The game and phase documents together, for reading and saving a tick in one request each
 
-    global active_game
+    GET returns {'game', 'phase', 'etags'}. A document whose ETag is listed in If-None-Match
+    comes back as null, and the response is a 304 when both are. POST takes
+    {'game': fields, 'phase': fields, 'replace': [names], 'events': [events]} and writes
+    both documents, and appends the tick's events to the game's log, in one transaction:
+    documents named in 'replace' are replaced wholesale, the others patched. Nothing is
+    written, and the answer is 412, if If-Match names a version of either document that is
+    no longer current.
+    """
 
+    docs = {'game': game_doc(game_id), 'phase': phase_doc(game_id)}
     if request.method == 'GET':
-        return(jsonify(active_game))
+        current = store.read(docs.values())
+        body = {'etags': {}}
+        for name, doc in docs.items():
+            version, modified, data = current[doc]
+            etag = document_etag(doc, version)
+            body['etags'][name] = quote_etag(etag)
+            body[name] = None if request.if_none_match.contains(etag) else data
+        if all(body[name] is None for name in docs):
+            response = Response(status=304)
+        else:
+            response = jsonify(body)
+        metrics.inc('hww_state_reads_total', status=response.status_code)
+        return(response)
     elif request.method == 'POST':
-        active_game = request.form['json']
-        json_helper.dump(active_game, active_game_fname)
-        return(jsonify(active_game))
+        update = read_json_form()
+        replace = update.get('replace', [])
+        events = update.get('events', [])
+        names = [name for name in docs if name in update]
+        snapshot_seq = base_snapshot(game_id) if len(events) > 0 else 0
+        try:
+            versions, seq = store.write_with_events([(docs[name], update[name], name in replace) for name in names], game_id, events,
+                expected_versions(docs.values()))
+        except VersionConflict as error:
+            return(conflict(error))
+        if seq is not None:
+            snapshot_if_due(game_id, snapshot_seq, seq)
+        return(jsonify({'etags': {name: quote_etag(document_etag(docs[name], version)) for name, version in zip(names, versions)}, 'seq': seq}))
     else:
         logging.error('DAFUQ request')
         abort(400)
 
+def rebuild_state(game_id):
+    """
+    Replay a game's events since its latest snapshot, returning (seq, state)
+    """
+
+    seq, snapshot = store.latest_snapshot(game_id)
+    events = store.events_since(game_id, seq)
+    if len(events) > 0:
+        seq = events[-1][0]
+    return seq, replay(empty_state() if snapshot is None else snapshot, [event for _, event in events])
+
+def base_snapshot(game_id):
+    """
+    Return the seq of a game's latest snapshot, first taking one of its current documents
+    if it started before the event log
+    """
+
+    snapshot_seq, snapshot = store.latest_snapshot(game_id)
+    if snapshot is None:
+        store.save_snapshot(game_id, 0, {'game': store.get(game_doc(game_id)), 'phase': store.get(phase_doc(game_id))})
+    return snapshot_seq
+
+def snapshot_if_due(game_id, snapshot_seq, seq):
+    if seq - snapshot_seq >= snapshot_interval:
+        snapshot_seq, state = rebuild_state(game_id)
+        store.save_snapshot(game_id, snapshot_seq, state)
+        logging.info('Snapshot of %s taken at event %s', game_id, snapshot_seq)
+
+@app.route('/events/', defaults={'game_id': default_game_id}, methods=['GET', 'POST'])
+@app.route('/games/<game_id>/events/', methods=['GET', 'POST'])
+def game_events(game_id):
+    """
+    A game's append-only event log
+
+    GET lists the events after ?since=<seq>, POST appends a list of events. Every
+    snapshot_interval events the log is compacted into a snapshot, so recovery only
+    has to replay a short tail.
+    """
+
+    if request.method == 'GET':
+        since = int(request.args.get('since', 0))
+        return(jsonify([{'seq': seq, 'event': event} for seq, event in store.events_since(game_id, since)]))
+    elif request.method == 'POST':
+        snapshot_seq = base_snapshot(game_id)
+        seq = store.append_events(game_id, read_json_form())
+        snapshot_if_due(game_id, snapshot_seq, seq)
+        return(jsonify({'seq': seq}))
+    else:
+        logging.error('DAFUQ request')
+        abort(400)
+
+@app.route('/recover/', defaults={'game_id': default_game_id}, methods=['POST'])
+@app.route('/games/<game_id>/recover/', methods=['POST'])
+def recover_game(game_id):
+    """
+    Rebuild a game's documents from its latest snapshot and the events after it
+
+    For undoing a bad write; stop the bot first, or it will save its own copy over the
+    recovered one. Queued outbound actions aren't events, so the queue comes back empty.
+    """
+
+    # One transaction, so events appended meanwhile are either replayed or come after the rebuild
+    with store.transaction():
+        seq, state = rebuild_state(game_id)
+        state['game']['outbound_queue'] = []
+        state['game']['outbound_dropped'] = []
+        store.replace(game_doc(game_id), state['game'])
+        store.replace(phase_doc(game_id), state['phase'])
+    logging.info('Recovered %s from its event log up to event %s', game_id, seq)
+    return(jsonify({'seq': seq, 'game': state['game'], 'phase': state['phase']}))
+
+@app.route('/metrics', methods=['GET', 'POST'])
+def metrics_endpoint():
+    """
+    Prometheus scrape endpoint; the bot POSTs its metrics here after each tick
+    """
+
+    if request.method == 'POST':
+        store.merge_metrics(read_json_form())
+        return(jsonify({}))
+    store.merge_metrics(metrics.take())
+    totals = Metrics()
+    totals.merge(store.metrics_snapshot())
+    return(Response(totals.render(), mimetype='text/plain; version=0.0.4'))
+
 class MyRequestHandler(WSGIRequestHandler):
     def log_request(self, code='-', size='-'):
-        if 200 == code:
+        if code in [200, 304]:
             pass
         else:
             logging.info('"%s" %s %s', self.requestline, code, size)
 
-def launch():
-    logging.info('Starting server...')
+def open_store():
+    """
+    Open the state store, once per process, and carry over data from older layouts
+    """
 
-    global active_game
-    try:
-        logging.debug('Loading active game data from {}'.format(active_game_fname))
-        active_game = json_helper.get_db(active_game_fname, encode_ascii=False)
-    except:
-        logging.exception('Failed to load game config from file')
-    logging.debug('Active game data: {}'.format(active_game))
+    global store
+    with store_lock:
+        if store is not None:
+            return
+        opened = StateStore(state_db_fname)
+        migrate(opened)
+        store = opened
 
-    global active_phase
-    try:
-        logging.debug('Loading active phase data from {}'.format(active_phase_fname))
-        active_phase = json_helper.get_db(active_phase_fname, encode_ascii=False)
-    except:
-        logging.exception('Failed to load phase data from file')
-    logging.debug('Active phase data: {}'.format(active_phase))
+def migrate(store):
+    # Documents from before multi-game support belong to the default game
+    for old_doc, new_doc in [('game', game_doc(default_game_id)), ('phase', phase_doc(default_game_id))]:
+        if store.exists(old_doc) and not store.exists(new_doc):
+            store.rename(old_doc, new_doc)
+            logging.info('Moved %s data to %s', old_doc, new_doc)
+    # Carry over the documents from the JSON files used before the SQLite store
+    for doc, fname in [(game_doc(default_game_id), active_game_fname), (phase_doc(default_game_id), active_phase_fname)]:
+        try:
+            if store.import_json(doc, fname):
+                logging.info('Imported %s data from %s', doc, fname)
+        except:
+            logging.exception('Failed to import %s data from %s', doc, fname)
 
 if __name__ == "__main__":
     try:
-        launch()
-        app.run(host= '0.0.0.0', port=8800, request_handler=MyRequestHandler)
+        logging.info('Starting server...')
+        open_store()
+        app.run(host= '0.0.0.0', port=8800, request_handler=MyRequestHandler, threaded=True)
     except Exception as e:
         if str(e).lower() != '[Errno 98] Address already in use'.lower():
             logging.exception(e)
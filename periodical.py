@@ -1,72 +1,314 @@
-from datetime import datetime, timezone
 import logging
-from logging.handlers import TimedRotatingFileHandler
+from LogPipeline import setup_logging, tick_context, tick_headers
 import Config
 
-handlers = set()
-handlers.add(TimedRotatingFileHandler('HWWGameBot.log', when='W0', backupCount=4))
-
-logging.basicConfig(level=logging.INFO, handlers=handlers, format='%(asctime)s %(levelname)s %(module)s:%(funcName)s %(message)s')
-logging.Formatter.formatTime = (lambda self, record, datefmt=None: datetime.fromtimestamp(record.created, timezone.utc).astimezone().isoformat(sep="T",timespec="milliseconds"))
+setup_logging('periodical')
 
+import argparse
+import asyncio
+import copy
 import json
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from games.AsyncBaseGame import AsyncBaseGame
 from games.Matrix6 import Matrix6
+from games.Metrics import registry
 from games.Test import Test
 
 request_url = 'http://0.0.0.0:8800'
 
-def get_game_data() -> dict:
-    payload = requests.get(request_url + '/game-data/').json()
+# One keep-alive connection pool for every call to the state server. urllib3's pool is
+# thread safe; it holds a connection per concurrent game tick plus the runner's own.
+state_pool_size = 16
+
+class StateSession(requests.Session):
+    """
+    Tags each request with the tick it was made for, see LogPipeline
+    """
+
+    def request(self, method, url, **kwargs):
+        kwargs['headers'] = dict(kwargs.get('headers') or {}, **tick_headers())
+        return requests.Session.request(self, method, url, **kwargs)
+
+session = StateSession()
+session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=state_pool_size))
+
+# What the state server calls the game behind the un-prefixed routes
+default_game_id = 'default'
+
+cache_fname = 'periodical_cache.json'
+
+# Last copy (and ETag) of each document known to be on the server, so unchanged
+# documents aren't downloaded again and saves only send changed fields. Keyed by
+# state_key(game_id, route); the lock keeps concurrent game ticks from racing.
+known_state = {}
+known_etag = {}
+cache_lock = threading.Lock()
+cache_loaded = False
+
+def state_url(route, game_id=None):
+    if game_id is None:
+        return request_url + '/' + route + '/'
+    return request_url + '/games/' + game_id + '/' + route + '/'
+
+def state_key(route, game_id=None):
+    return route if game_id is None else game_id + '/' + route
+
+def load_cache():
+    global cache_loaded
+    cache_loaded = True
+    try:
+        with open(cache_fname) as cache_file:
+            cache = json.load(cache_file)
+        for key in cache:
+            known_state[key] = cache[key]['body']
+            known_etag[key] = cache[key]['etag']
+    except FileNotFoundError:
+        pass
+    except:
+        logging.exception('Ignoring unreadable state cache %s', cache_fname)
+
+def save_cache():
+    # Callers hold cache_lock. Write then rename, so a crash never leaves half a cache behind;
+    # the cache holds the whole game, secret roles included, so only we can read it.
+    try:
+        with open(cache_fname + '.tmp', 'w') as cache_file:
+            os.chmod(cache_fname + '.tmp', 0o600)
+            json.dump({key: {'body': known_state[key], 'etag': known_etag.get(key)} for key in known_state}, cache_file)
+        os.replace(cache_fname + '.tmp', cache_fname)
+    except:
+        logging.exception('Failed to write state cache %s', cache_fname)
+
+def remember_states(states):
+    """
+    Remember several (key, data, etag) server copies, rewriting the cache file only if one changed
+    """
+
+    with cache_lock:
+        changed = False
+        for key, data, etag in states:
+            if known_etag.get(key) == etag and known_state.get(key) == data:
+                continue
+            known_state[key] = copy.deepcopy(data)
+            known_etag[key] = etag
+            changed = True
+        if changed:
+            save_cache()
+
+def remember_state(key, data, etag):
+    remember_states([(key, data, etag)])
+
+def get_state(route, game_id=None) -> dict:
+    key = state_key(route, game_id)
+    with cache_lock:
+        if not cache_loaded:
+            load_cache()
+        known = known_state.get(key)
+        headers = {}
+        if known is not None and known_etag.get(key) is not None:
+            headers['If-None-Match'] = known_etag[key]
+    response = session.get(state_url(route, game_id), headers=headers)
+    if response.status_code == 304:
+        logging.debug('%s unchanged since %s', key, headers['If-None-Match'])
+        return copy.deepcopy(known)
+    response.raise_for_status()
+    payload = response.json()
     if isinstance(payload, str):
         payload = json.loads(payload)
-    logging.debug('Active game data is {}'.format(payload))
+    remember_state(key, payload, response.headers.get('ETag'))
     return payload
 
-def update_game_data(updates):
-    requests.post(request_url + '/game-data/', {'json': json.dumps(updates)})
+class StateConflict(Exception):
+    """
+    The server's copy of a document changed under us, so deltas against ours would corrupt it
+    """
 
-def get_phase_data() -> dict:
-    payload = requests.get(request_url + '/phase-data/').json()
-    if isinstance(payload, str):
-        payload = json.loads(payload)
-    logging.debug('Current phase data is {}'.format(payload))
+def forget_state(keys):
+    with cache_lock:
+        forgotten = [key for key in keys if key in known_state]
+        for key in keys:
+            known_state.pop(key, None)
+            known_etag.pop(key, None)
+        if len(forgotten) > 0:
+            save_cache()
+
+def check_conflict(response, keys):
+    if response.status_code == 412:
+        # Reset, recovered or written by someone else; the caller reloads before saving again
+        logging.warning('%s changed on the server since it was read, reloading', keys)
+        forget_state(keys)
+        raise StateConflict('{} changed on the server'.format(keys))
+
+def changed_fields(known, data):
+    return {field: value for field, value in data.items() if field not in known or known[field] != value}
+
+def save_state(route, data, game_id=None):
+    key = state_key(route, game_id)
+    with cache_lock:
+        known = known_state.get(key)
+        etag = known_etag.get(key)
+    if known is None:
+        response = session.post(state_url(route, game_id), {'json': json.dumps(data)})
+    else:
+        delta = changed_fields(known, data)
+        if len(delta) < 1:
+            return
+        logging.debug('Updating %s fields %s', key, list(delta))
+        # The delta is only valid against the version it was worked out from
+        headers = {} if etag is None else {'If-Match': etag}
+        response = session.patch(state_url(route, game_id), {'json': json.dumps(delta)}, headers=headers)
+        check_conflict(response, [key])
+    response.raise_for_status()
+    remember_state(key, data, response.headers.get('ETag'))
+
+def get_game_data(game_id=None) -> dict:
+    payload = get_state('game-data', game_id)
+    logging.debug('Active game data is %s', payload)
     return payload
 
-def update_phase_data(updates):
-    requests.post(request_url + '/phase-data/', {'json': json.dumps(updates)})
+def update_game_data(updates, game_id=None):
+    save_state('game-data', updates, game_id)
 
-def main():
-    config = Config.Config('myconfig')
-    reddit = config.reddit_object
+def get_phase_data(game_id=None) -> dict:
+    payload = get_state('phase-data', game_id)
+    logging.debug('Current phase data is %s', payload)
+    return payload
 
-    # Get the game config and phase data
-    game_data = get_game_data()
-    phase_data = get_phase_data()
+def update_phase_data(updates, game_id=None):
+    save_state('phase-data', updates, game_id)
+
+# Routes of the game and phase documents, by their names in /tick-state/
+tick_documents = {'game': 'game-data', 'phase': 'phase-data'}
+
+def get_tick_state(game_id=None):
+    """
+    Fetch the game and phase data in one request, reusing whichever is unchanged
+    """
+
+    keys = {name: state_key(route, game_id) for name, route in tick_documents.items()}
+    with cache_lock:
+        if not cache_loaded:
+            load_cache()
+        known = {name: known_state.get(key) for name, key in keys.items()}
+        etags = [known_etag[key] for name, key in keys.items() if known[name] is not None and known_etag.get(key) is not None]
+    headers = {} if len(etags) < 1 else {'If-None-Match': ', '.join(etags)}
+    response = session.get(state_url('tick-state', game_id), headers=headers)
+    if response.status_code == 304:
+        logging.debug('Tick state of %s unchanged', game_id or default_game_id)
+        return copy.deepcopy(known['game']), copy.deepcopy(known['phase'])
+    response.raise_for_status()
+    payload = response.json()
+    documents = {}
+    for name, key in keys.items():
+        documents[name] = copy.deepcopy(known[name]) if payload[name] is None else payload[name]
+    remember_states([(key, payload[name], payload['etags'][name]) for name, key in keys.items() if payload[name] is not None])
+    logging.debug('Active game data is %s', documents['game'])
+    return documents['game'], documents['phase']
+
+def save_tick_state(game_data, phase_data=None, game_id=None, events=()):
+    """
+    Save the game data, and the phase data if given, in one atomic request along with the
+    events that led to them (see games.EventLog)
+
+    Only changed fields are sent, on the condition that the server's copy is still the one
+    they were worked out from; a document the server's copy of isn't known is sent whole.
+    Raises StateConflict if the server's copy has changed.
+    """
+
+    data = {'game': game_data} if phase_data is None else {'game': game_data, 'phase': phase_data}
+    keys = {name: state_key(tick_documents[name], game_id) for name in data}
+    update = {'replace': []}
+    etags = []
+    with cache_lock:
+        for name, key in keys.items():
+            known = known_state.get(key)
+            if known is None:
+                update[name] = data[name]
+                update['replace'].append(name)
+            else:
+                delta = changed_fields(known, data[name])
+                if len(delta) > 0:
+                    update[name] = delta
+                    if known_etag.get(key) is not None:
+                        etags.append(known_etag[key])
+    written = [name for name in data if name in update]
+    if len(written) < 1 and len(events) < 1:
+        return
+    if len(events) > 0:
+        update['events'] = list(events)
+    logging.debug('Updating %s with %s events in one request', written, len(events))
+    headers = {} if len(etags) < 1 else {'If-Match': ', '.join(etags)}
+    response = session.post(state_url('tick-state', game_id), {'json': json.dumps(update)}, headers=headers)
+    check_conflict(response, list(keys.values()))
+    response.raise_for_status()
+    etags = response.json()['etags']
+    remember_states([(keys[name], data[name], etags[name]) for name in written])
+
+def list_games():
+    response = session.get(request_url + '/games/')
+    response.raise_for_status()
+    return [game['game_id'] for game in response.json()]
+
+def push_metrics():
+    """
+    Send what's been recorded since the last push to the state server's /metrics
+    """
+
+    snapshot = registry.take()
+    try:
+        response = session.post(request_url + '/metrics', {'json': json.dumps(snapshot)})
+        response.raise_for_status()
+    except:
+        logging.warning('Failed to push metrics, keeping them for the next push', exc_info=True)
+        registry.merge(snapshot)
+
+def save_game(game, game_id=None, with_phase=True):
+    """
+    Save the game's documents and its new events together; events stay on the game if the save fails
+    """
 
+    events = list(game.pending_events())
+    phase_data = game.get_phase_data() if with_phase else None
+    save_tick_state(game.get_game_data(), phase_data, game_id, events)
+    del game.events[:len(events)]
+
+def phase_label(game_phase):
+    # Game phases are numbered; one series for all of them is enough
+    return 'game' if isinstance(game_phase, int) else game_phase
+
+def build_game(reddit, game_data, phase_data):
     # Instantiate the game object based on what kind of game we're playing
-    game = None
     if game_data['game_type'] == 'matrix6':
-        game = Matrix6(reddit, game_data, phase_data)
+        return Matrix6(reddit, game_data, phase_data)
     elif game_data['game_type'] == 'test':
-        game = Test(reddit, game_data, phase_data)
+        return Test(reddit, game_data, phase_data)
     else:
         raise Exception('Unknown game type specified')
 
+def load_game(reddit, game_id=None):
+    # Get the game config and phase data
+    game_data, phase_data = get_tick_state(game_id)
+    return build_game(reddit, game_data, phase_data)
+
+def step_game(game, messages=None):
+    """
+    Advance the game by one tick without saving it. When several games share the bot's
+    inbox the caller passes the messages routed to this game instead of reading the inbox.
+    """
+
     if game.game_phase == 'init':
         logging.info('Init new game')
         game.init_new_game()
-        update_game_data(game.get_game_data())
     elif game.game_phase == 'signup':
         logging.debug('Handle signups')
         game.handle_signups()
-        update_game_data(game.get_game_data())
     elif game.game_phase == 'confirmation':
         logging.debug('Handle confirmations')
-        # TODO: Add a confirmation timeout. If folks haven't confirmed in 24 hours
-        # proceed without them confirming? Or re-send role PMs at 12 hours?
-        game.handle_confirmations()
-        update_game_data(game.get_game_data())
+        game.handle_confirmations(messages)
     elif game.game_phase == 'finale':
         pass
     else:
@@ -74,12 +316,248 @@ def main():
         try:
             game.handle_main_sub_comments()
             game.handle_wolf_sub_comments()
-            game.handle_private_messages()
+            game.handle_inbox(messages)
             game.handle_turnover()
         except:
             logging.exception('Something went wrong processing comments and turnover')
-        update_game_data(game.get_game_data())
-        update_phase_data(game.get_phase_data())
+
+def run_tick(game, game_id=None, messages=None):
+    """
+    Advance the game by one tick and save it
+    """
+
+    game_phase = game.game_phase
+    start = time.perf_counter()
+    step_game(game, messages)
+    registry.observe('hww_tick_seconds', time.perf_counter() - start, phase=phase_label(game_phase))
+    registry.set('hww_outbound_queue_depth', len(game.outbound.pending), game=game_id or default_game_id)
+    if game_phase == 'finale':
+        return
+    save_game(game, game_id, game_phase not in ['init', 'signup', 'confirmation'])
+    # Only now that the tick is saved can its messages be dropped from the inbox
+    game.mark_inbox_read()
+
+def next_wake(game, next_tick):
+    """
+    When to tick the game next: the regular interval, or its turnover if that comes first
+    """
+
+    if game.phase_deadline is not None and time.time() < game.phase_deadline < next_tick:
+        return game.phase_deadline
+    return next_tick
+
+def drain_outbound(reddit, game, until, stop, game_id=None):
+    """
+    Send queued replies, PMs and moderation actions until the deadline, saving progress
+    """
+
+    while not stop.is_set():
+        handled = game.outbound.drain(reddit, budget_seconds=max(0, until - time.time()))
+        if handled > 0:
+            update_game_data(game.get_game_data(), game_id)
+        ready = game.outbound.next_ready_time()
+        if ready is None or ready >= until or (handled == 0 and ready <= time.time()):
+            return
+        stop.wait(max(0, ready - time.time()))
+
+def main(drain_seconds):
+    config = Config.Config('myconfig')
+    reddit = config.reddit_object
+    with tick_context(default_game_id):
+        game = load_game(reddit)
+        run_tick(game)
+        drain_outbound(reddit, game, time.time() + drain_seconds, threading.Event())
+        push_metrics()
+
+async def async_main(drain_seconds):
+    """
+    One-shot tick that fetches the game phase's threads and inbox concurrently
+    """
+
+    config = Config.Config('myconfig')
+    reddit = config.reddit_object
+    with tick_context(default_game_id):
+        game = await asyncio.to_thread(load_game, reddit)
+        if game.game_phase in ['init', 'signup', 'confirmation', 'finale']:
+            await asyncio.to_thread(run_tick, game)
+            await asyncio.to_thread(drain_outbound, reddit, game, time.time() + drain_seconds, threading.Event())
+            await asyncio.to_thread(push_metrics)
+            return
+
+        async with config.async_reddit_object() as async_reddit:
+            async_game = AsyncBaseGame(game, async_reddit)
+            start = time.perf_counter()
+            try:
+                await async_game.handle_game_phase()
+            except:
+                logging.exception('Something went wrong processing comments and turnover')
+            registry.observe('hww_tick_seconds', time.perf_counter() - start, phase=phase_label(game.game_phase))
+            await asyncio.to_thread(save_game, game)
+            await async_game.mark_inbox_read()
+            if await async_game.drain_outbound(drain_seconds) > 0:
+                await asyncio.to_thread(update_game_data, game.get_game_data())
+            registry.set('hww_outbound_queue_depth', len(game.outbound.pending), game=default_game_id)
+        await asyncio.to_thread(push_metrics)
+
+def install_stop_handlers(stop):
+    def request_stop(signum, frame):
+        logging.info('Received signal %s, stopping after the current tick', signum)
+        stop.set()
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+def daemon(interval_seconds):
+    """
+    Run ticks forever, keeping the Reddit client and the game object warm between them
+    """
+
+    stop = threading.Event()
+    install_stop_handlers(stop)
+
+    config = Config.Config('myconfig')
+    reddit = config.reddit_object
+    game = None
+
+    logging.info('Starting daemon with a %s second tick interval', interval_seconds)
+    while not stop.is_set():
+        next_tick = time.time() + interval_seconds
+        with tick_context(default_game_id):
+            try:
+                if game is None:
+                    game = load_game(reddit)
+                run_tick(game)
+                # Wake up right at turnover instead of up to an interval late
+                next_tick = next_wake(game, next_tick)
+                # The tick is saved, so spend the rest of the interval draining the outbound queue
+                drain_outbound(reddit, game, next_tick, stop)
+                if game.game_phase == 'finale' and len(game.outbound.pending) < 1:
+                    # Nothing left to drive, so pick up a reset from the state server next tick
+                    game = None
+            except:
+                logging.exception('Tick failed, reloading game state from the server next tick')
+                game = None
+        push_metrics()
+        stop.wait(max(0, next_tick - time.time()))
+    logging.info('Daemon stopped')
+
+class GameRunner:
+    """
+    Tick every active game concurrently on a bounded worker pool
+
+    Each game keeps its own warm Reddit client (praw clients aren't thread safe) and is
+    only ever ticked by one worker at a time, on its own schedule, so a slow game can't
+    hold up the others. The bot's inbox is shared, so it is read once here and each
+    message is routed to the game its author plays in.
+    """
+
+    def __init__(self, interval_seconds, workers, stop):
+        self.interval_seconds = interval_seconds
+        self.stop = stop
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.config = Config.Config('myconfig')
+        self.reddit = self.config.reddit_object
+        # game_id -> (reddit, game). Workers and the routing loop share this, mailboxes and routed, so they only change under lock
+        self.games = {}
+        self.running = {}
+        self.next_tick = {}
+        self.mailboxes = {}
+        self.routed = set()
+        self.lock = threading.Lock()
+
+    def route_inbox(self, active):
+        unread = [message for message in self.reddit.inbox.unread(limit=None) if message.id not in self.routed]
+        ignored = []
+        with self.lock:
+            for message in unread:
+                author = '' if message.author is None else message.author.name.lower()
+                owner = None
+                for game_id in active:
+                    if game_id in self.games and self.games[game_id][1].involves(author):
+                        owner = game_id
+                        break
+                if owner is not None:
+                    self.mailboxes.setdefault(owner, []).append(message)
+                    self.routed.add(message.id)
+                elif all(game_id in self.games for game_id in active):
+                    ignored.append(message)
+        if len(ignored) > 0:
+            logging.info('Marking %s messages from non-players read', len(ignored))
+            self.reddit.inbox.mark_read(ignored)
+
+    def tick_game(self, game_id, until):
+        with tick_context(game_id):
+            messages = []
+            try:
+                with self.lock:
+                    loaded = self.games.get(game_id)
+                if loaded is None:
+                    # Load outside the lock; only this worker ticks the game, so nobody else adds it meanwhile
+                    reddit = Config.Config('myconfig').reddit_object
+                    loaded = (reddit, load_game(reddit, game_id))
+                    with self.lock:
+                        self.games[game_id] = loaded
+                reddit, game = loaded
+                with self.lock:
+                    messages = self.mailboxes.pop(game_id, [])
+                reads_inbox = game.game_phase not in ['init', 'signup', 'finale']
+                run_tick(game, game_id, messages)
+                if not reads_inbox and len(messages) > 0:
+                    reddit.inbox.mark_read(messages)
+                with self.lock:
+                    self.routed.difference_update(message.id for message in messages)
+                until = next_wake(game, until)
+                self.next_tick[game_id] = until
+                drain_outbound(reddit, game, until, self.stop, game_id)
+                if game.game_phase == 'finale' and len(game.outbound.pending) < 1:
+                    with self.lock:
+                        del self.games[game_id]
+            except:
+                logging.exception('Tick failed for game %s, reloading its state next tick', game_id)
+                with self.lock:
+                    self.games.pop(game_id, None)
+                    # Whatever is still unread gets routed again to the reloaded game
+                    self.routed.difference_update(message.id for message in messages)
+
+    def run(self):
+        logging.info('Starting game runner with a %s second tick interval', self.interval_seconds)
+        while not self.stop.is_set():
+            try:
+                active = list_games()
+                self.route_inbox(active)
+            except:
+                logging.exception('Failed to refresh the active games')
+                active = []
+            push_metrics()
+            for game_id in active:
+                if game_id in self.running and not self.running[game_id].done():
+                    continue
+                if time.time() < self.next_tick.get(game_id, 0):
+                    continue
+                self.next_tick[game_id] = time.time() + self.interval_seconds
+                self.running[game_id] = self.executor.submit(self.tick_game, game_id, self.next_tick[game_id])
+            self.stop.wait(min(5, self.interval_seconds))
+        self.executor.shutdown(wait=True)
+        logging.info('Game runner stopped')
+
+def run_all_games(interval_seconds, workers):
+    stop = threading.Event()
+    install_stop_handlers(stop)
+    GameRunner(interval_seconds, workers, stop).run()
 
 if __name__ == '__main__':
-	main()
+    parser = argparse.ArgumentParser(description='Drive the active HWW game')
+    parser.add_argument('--daemon', action='store_true', help='keep running and tick every --interval seconds')
+    parser.add_argument('--interval', type=int, default=60, help='seconds between ticks in daemon mode')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='run one tick with concurrent asyncpraw fetches')
+    parser.add_argument('--all-games', action='store_true', help='keep running and tick every active game on the state server')
+    parser.add_argument('--workers', type=int, default=4, help='how many games --all-games ticks at once')
+    parser.add_argument('--drain-seconds', type=int, default=45, help='how long a one-shot run may spend sending queued actions')
+    args = parser.parse_args()
+    if args.all_games:
+        run_all_games(args.interval, args.workers)
+    elif args.daemon:
+        daemon(args.interval)
+    elif args.use_async:
+        asyncio.run(async_main(args.drain_seconds))
+    else:
+        main(args.drain_seconds)
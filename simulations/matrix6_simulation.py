@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# Monte Carlo balance simulation for the Matrix6 setups. Each batch of games is held in
+# NumPy arrays (one row per game) and the whole batch advances a phase at a time: the
+# day vote, then the night actions in games.NightActions order, then the win check.
+#
+#   python -m simulations.matrix6_simulation --games 1000000 --town-votes seer_led --wolf-votes bandwagon
+#
+# Roles and night actions come from games.Matrix6, so edits to role_lists or
+# night_roles are picked up here. The Tracker's result is never used by these policies,
+# so it has no effect on the outcome. NumPy is only needed for this script, not by the bot.
+import argparse
+import math
+import time
+
+import numpy as np
+
+from games.GameState import WOLF, alignment_of
+from games.Matrix6 import night_roles, role_lists
+
+# role_lists[0..2] are the columns of the signup table and role_lists[3..5] its rows
+setup_labels = ['Column A', 'Column B', 'Column C', 'Row 1', 'Row 2', 'Row 3']
+
+NO_PLAYER = -1
+UNKNOWN, SEEN_TOWN, SEEN_WOLF = 0, 1, 2
+UNDECIDED, TOWN_WIN, WOLF_WIN = 0, 1, 2
+
+def holder(role_list, action_type):
+    for i, role in enumerate(role_list):
+        if night_roles.get(role) == action_type:
+            return i
+    return NO_PLAYER
+
+def choose(rng, candidates):
+    """
+    Pick one True column uniformly at random from each row, or NO_PLAYER where a row has none
+    """
+
+    scores = np.where(candidates, rng.random(candidates.shape, dtype=np.float32), -1)
+    picks = scores.argmax(axis=-1)
+    # Rows without candidates pick a -1 score, which isn't a candidate either
+    valid = np.take_along_axis(candidates, picks[..., None], axis=-1)[..., 0]
+    return np.where(valid, picks, NO_PLAYER)
+
+def night_target(rng, alive, player, candidates, stopped=None):
+    """
+    Random target for `player`'s action in every game, NO_PLAYER where they are dead or stopped
+    """
+
+    games = alive.shape[0]
+    if player == NO_PLAYER:
+        return np.full(games, NO_PLAYER)
+    candidates = candidates & alive
+    candidates[:, player] = False
+    targets = choose(rng, candidates)
+    acting = alive[:, player] if stopped is None else alive[:, player] & ~stopped
+    return np.where(acting, targets, NO_PLAYER)
+
+class Matrix6Batch:
+    def __init__(self, role_list, games, rng, town_votes, wolf_votes, kill_policy):
+        self.rng = rng
+        self.town_votes = town_votes
+        self.wolf_votes = wolf_votes
+        self.kill_policy = kill_policy
+        self.players = len(role_list)
+        self.wolves = np.array([alignment_of(role) == WOLF for role in role_list])
+        self.blocker = holder(role_list, 'block')
+        self.jailer = holder(role_list, 'jail')
+        self.doctor = holder(role_list, 'protect')
+        self.seer = holder(role_list, 'inspect')
+        self.bulletproof = holder(role_list, 'bulletproof')
+
+        self.rows = np.arange(games)
+        # Index of each row into winner/phases; finished games are dropped from the other arrays
+        self.ids = np.arange(games)
+        self.alive = np.ones((games, self.players), dtype=bool)
+        self.vest = np.ones(games, dtype=bool)
+        self.seen = np.zeros((games, self.players), dtype=np.int8)
+        self.voted_wolf = np.zeros((games, self.players), dtype=bool)
+        self.winner = np.zeros(games, dtype=np.int8)
+        self.phases = np.zeros(games, dtype=np.int16)
+        self.not_self = ~np.eye(self.players, dtype=bool)
+
+    def day(self):
+        rng, alive, wolves = self.rng, self.alive, self.wolves
+        votes = choose(rng, alive[:, None, :] & self.not_self[None, :, :])
+
+        if self.wolf_votes == 'bandwagon':
+            wagon = choose(rng, alive & ~wolves)
+            votes[:, wolves] = wagon[:, None]
+        if self.town_votes == 'seer_led' and self.seer != NO_PLAYER:
+            # A living seer claims and town piles onto a wolf they have seen
+            suspect = choose(rng, alive & (self.seen == SEEN_WOLF))
+            follow = alive[:, self.seer] & (suspect != NO_PLAYER)
+            votes[:, ~wolves] = np.where(follow[:, None], suspect[:, None], votes[:, ~wolves])
+        votes[~alive] = NO_PLAYER
+
+        # One bincount over (game, target) pairs, with an extra column for abstentions
+        flat = self.rows[:, None] * (self.players + 1) + np.where(votes == NO_PLAYER, self.players, votes)
+        counts = np.bincount(flat.ravel(), minlength=len(self.rows) * (self.players + 1))
+        counts = counts.reshape(len(self.rows), self.players + 1)[:, :self.players]
+        # Random tie-break, like handle_turnover
+        scores = counts + rng.random(counts.shape, dtype=np.float32) * 0.5
+        scores[~alive] = -1
+        voted_out = scores.argmax(axis=1)
+        self.voted_wolf = (votes != NO_PLAYER) & wolves[np.maximum(votes, 0)]
+        alive[self.rows, voted_out] = False
+
+    def night(self):
+        rng, alive, wolves = self.rng, self.alive, self.wolves
+        everyone = np.ones_like(alive)
+
+        blocked = night_target(rng, alive, self.blocker, ~wolves[None, :] & everyone)
+        jailed = night_target(rng, alive, self.jailer, everyone, blocked == self.jailer)
+        stopped = lambda player: (blocked == player) | (jailed == player)
+        protected = night_target(rng, alive, self.doctor, everyone, stopped(self.doctor))
+        inspected = night_target(rng, alive, self.seer, self.seen == UNKNOWN, stopped(self.seer))
+        seeing = inspected != NO_PLAYER
+        self.seen[self.rows[seeing], inspected[seeing]] = np.where(wolves[inspected[seeing]], SEEN_WOLF, SEEN_TOWN)
+
+        killer = choose(rng, alive & wolves)
+        town = alive & ~wolves
+        target = choose(rng, town)
+        if self.kill_policy == 'vocal':
+            # Go after town who voted for a wolf today, when there are any
+            vocal = choose(rng, town & self.voted_wolf)
+            target = np.where(vocal != NO_PLAYER, vocal, target)
+        kills = (killer != NO_PLAYER) & (jailed != killer) & (target != NO_PLAYER)
+        kills &= (target != protected) & (target != jailed)
+        if self.bulletproof != NO_PLAYER:
+            hit = kills & (target == self.bulletproof) & self.vest
+            self.vest &= ~hit
+            kills &= ~hit
+        alive[self.rows[kills], target[kills]] = False
+
+    def keep(self, active):
+        self.ids = self.ids[active]
+        self.alive = self.alive[active]
+        self.vest = self.vest[active]
+        self.seen = self.seen[active]
+        self.voted_wolf = self.voted_wolf[active]
+        self.rows = np.arange(len(self.ids))
+
+    def run(self, max_phases=20):
+        for phase in range(max_phases):
+            if len(self.ids) < 1:
+                break
+            self.day()
+            self.night()
+            self.phases[self.ids] += 1
+
+            wolves_left = (self.alive & self.wolves).sum(axis=1)
+            town_left = (self.alive & ~self.wolves).sum(axis=1)
+            self.winner[self.ids[wolves_left == 0]] = TOWN_WIN
+            self.winner[self.ids[(wolves_left > 0) & (town_left <= wolves_left)]] = WOLF_WIN
+            self.keep(self.winner[self.ids] == UNDECIDED)
+        return self.winner, self.phases
+
+def simulate(role_list, games, batch_size, rng, town_votes, wolf_votes, kill_policy):
+    town_wins = 0
+    phases = 0
+    remaining = games
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        winner, batch_phases = Matrix6Batch(role_list, size, rng, town_votes, wolf_votes, kill_policy).run()
+        town_wins += int((winner == TOWN_WIN).sum())
+        phases += int(batch_phases.sum())
+        remaining -= size
+    return town_wins, phases
+
+def main():
+    parser = argparse.ArgumentParser(description='Monte Carlo win rates for the Matrix6 setups')
+    parser.add_argument('--games', type=int, default=200000, help='games per setup')
+    parser.add_argument('--batch', type=int, default=100000, help='games held in memory at once')
+    parser.add_argument('--town-votes', choices=['random', 'seer_led'], default='random')
+    parser.add_argument('--wolf-votes', choices=['random', 'bandwagon'], default='random')
+    parser.add_argument('--kill-policy', choices=['random', 'vocal'], default='random')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print('{:<10} {:>10} {:>14} {:>10} {:>8}'.format('Setup', 'Games', 'Town win', '+/-', 'Phases'))
+    overall = 0
+    start = time.perf_counter()
+    for label, role_list in zip(setup_labels, role_lists):
+        town_wins, phases = simulate(role_list, args.games, args.batch, rng, args.town_votes, args.wolf_votes, args.kill_policy)
+        rate = town_wins / args.games
+        margin = 1.96 * math.sqrt(rate * (1 - rate) / args.games)
+        overall += rate
+        print('{:<10} {:>10} {:>13.2%} {:>9.2%} {:>8.2f}'.format(label, args.games, rate, margin, phases / args.games))
+    # The bot picks a setup uniformly, so the overall rate is the plain average
+    print('{:<10} {:>10} {:>13.2%}'.format('Overall', args.games * len(role_lists), overall / len(role_lists)))
+    print('{:.1f}s'.format(time.perf_counter() - start))
+
+if __name__ == '__main__':
+    main()
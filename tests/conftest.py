@@ -0,0 +1,113 @@
+import pytest
+from benchmarks.fake_reddit import FakeReddit
+from games.BaseGame import BaseGame
+
+class SmallGame(BaseGame):
+    """
+    Game that deals a fixed list of roles in signup order, driven against FakeReddit
+    """
+
+    def __init__(self, reddit, game_data, phase_data, role_list):
+        self.role_list = role_list
+        BaseGame.__init__(self, reddit, game_data, phase_data)
+
+    def game_type(self):
+        return 'small'
+
+    def player_limit(self):
+        return len(self.role_list)
+
+    def signup_post_title(self):
+        return 'Signups'
+
+    def signup_post_text(self):
+        return 'Comment `!signup` to join.'
+
+    def assign_roles(self):
+        for player, role in zip(self.live_players.to_list(), self.role_list):
+            self.roles[player] = role
+
+    def phase_post_title(self):
+        return 'Phase {}'.format(self.game_phase)
+
+    def phase_post_text(self, sorted_votes, voted_out, wolf_kill, is_wolf_sub):
+        return 'Living Players:\n\n* {}'.format('\n* '.join(self.live_players))
+
+    def role_pm_text(self, player):
+        return 'Your role is **{}**'.format(self.roles[player])
+
+@pytest.fixture
+def reddit():
+    return FakeReddit()
+
+@pytest.fixture
+def make_game(reddit):
+    def make_game(roles, game_phase=1, game_data=None, phase_data=None):
+        data = {'game_type': 'small', 'game_phase': game_phase, 'roles': dict(roles), 'live_players': list(roles), 'rng_seed': 1}
+        data.update(game_data or {})
+        return SmallGame(reddit, data, phase_data or {}, list(roles.values()))
+    return make_game
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # The server sets up its log files on import, so import it inside the scratch directory
+    monkeypatch.chdir(tmp_path)
+    import hww_server
+    monkeypatch.setattr(hww_server, 'state_db_fname', str(tmp_path / 'state.db'))
+    monkeypatch.setattr(hww_server, 'active_game_fname', str(tmp_path / 'active_game.json'))
+    monkeypatch.setattr(hww_server, 'active_phase_fname', str(tmp_path / 'active_phase.json'))
+    monkeypatch.setattr(hww_server, 'store', None)
+    return hww_server
+
+class StateResponse:
+    """
+    Flask test response with the parts of a requests.Response periodical.py uses
+    """
+
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+
+    def json(self):
+        return self.response.get_json()
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise Exception('HTTP {}'.format(self.status_code))
+
+class StateSession:
+    """
+    Sends periodical.py's state server requests to the Flask app in-process
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.requests = []
+
+    def request(self, method, url, data=None, headers=None):
+        path = url[len(periodical_url):]
+        self.requests.append((method, path))
+        return StateResponse(self.client.open(path, method=method, data=data, headers=headers or {}))
+
+    def get(self, url, headers=None):
+        return self.request('GET', url, headers=headers)
+
+    def post(self, url, data=None, headers=None):
+        return self.request('POST', url, data, headers)
+
+    def patch(self, url, data=None, headers=None):
+        return self.request('PATCH', url, data, headers)
+
+periodical_url = 'http://state'
+
+@pytest.fixture
+def periodical(server, tmp_path, monkeypatch):
+    import periodical
+    monkeypatch.setattr(periodical, 'request_url', periodical_url)
+    monkeypatch.setattr(periodical, 'session', StateSession(server.app.test_client()))
+    monkeypatch.setattr(periodical, 'cache_fname', str(tmp_path / 'periodical_cache.json'))
+    monkeypatch.setattr(periodical, 'known_state', {})
+    monkeypatch.setattr(periodical, 'known_etag', {})
+    monkeypatch.setattr(periodical, 'cache_loaded', True)
+    return periodical
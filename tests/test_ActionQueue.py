@@ -0,0 +1,92 @@
+from games.ActionQueue import MAX_ATTEMPTS, RATE_LIMIT_RESERVE, ActionQueue
+
+class Thing:
+    def __init__(self, fullname):
+        self.fullname = fullname
+
+def flaky(queue, failing):
+    # Make every action addressed to one of the failing thing ids raise
+    perform = queue.perform
+    def maybe_perform(reddit, entry):
+        if entry['params'].get('thing_id') in failing:
+            raise Exception('Reddit is down')
+        perform(reddit, entry)
+    queue.perform = maybe_perform
+
+def test_drain_sends_in_order(reddit):
+    queue = ActionQueue()
+    for i in range(5):
+        queue.reply(Thing('t4_{}'.format(i)), 'reply {}'.format(i))
+
+    assert queue.drain(reddit) == 5
+    assert [text for thing_id, text in reddit.replies] == ['reply {}'.format(i) for i in range(5)]
+    assert queue.pending == []
+
+def test_delayed_actions_wait(reddit):
+    queue = ActionQueue()
+    queue.reply(Thing('t4_late'), 'late', delay=60)
+    queue.reply(Thing('t4_now'), 'now')
+
+    assert queue.drain(reddit) == 1
+    assert [entry['params']['text'] for entry in queue.pending] == ['late']
+    assert queue.next_ready_time() == queue.pending[0]['not_before']
+
+def test_earliest_due_goes_first(reddit):
+    queue = ActionQueue()
+    queue.reply(Thing('t4_second'), 'second')
+    queue.reply(Thing('t4_first'), 'first')
+    queue.pending[1]['not_before'] -= 10
+
+    queue.drain(reddit)
+
+    assert [text for thing_id, text in reddit.replies] == ['first', 'second']
+
+def test_failed_action_is_retried_later(reddit):
+    queue = ActionQueue()
+    queue.reply(Thing('t4_bad'), 'bad')
+    queue.reply(Thing('t4_good'), 'good')
+    flaky(queue, ['t4_bad'])
+
+    assert queue.drain(reddit) == 1
+    assert len(queue.pending) == 1
+    assert queue.pending[0]['attempts'] == 1
+
+def test_action_is_dropped_after_its_attempts(reddit):
+    queue = ActionQueue()
+    queue.message('alice', 'Role', 'text', key='role_pm:alice')
+    queue.reply(Thing('t4_bad'), 'bad')
+    queue.perform = lambda reddit, entry: (_ for _ in ()).throw(Exception('Reddit is down'))
+
+    for _ in range(MAX_ATTEMPTS):
+        for entry in queue.pending:
+            entry['not_before'] = 0
+        queue.drain(reddit)
+
+    assert queue.pending == []
+    assert queue.take_dropped() == {'role_pm:alice'}
+    assert queue.take_dropped() == set()
+
+def test_drain_stops_when_the_rate_limit_is_spent(reddit):
+    reddit.rate_limit = RATE_LIMIT_RESERVE + 2
+    queue = ActionQueue()
+    for i in range(5):
+        queue.reply(Thing('t4_{}'.format(i)), 'reply {}'.format(i))
+
+    assert queue.drain(reddit, budget_seconds=1) == 2
+    assert len(queue.pending) == 3
+
+def test_large_backlog_drains_in_one_pass(reddit):
+    queue = ActionQueue()
+    for i in range(20000):
+        queue.reply(Thing('t4_{}'.format(i)), 'reply')
+    flaky(queue, ['t4_{}'.format(i) for i in range(0, 20000, 1000)])
+
+    assert queue.drain(reddit) == 19980
+    assert [entry['params']['thing_id'] for entry in queue.pending] == ['t4_{}'.format(i) for i in range(0, 20000, 1000)]
+
+def test_pending_keys():
+    queue = ActionQueue()
+    queue.message('alice', 'Role', 'text', key='role_pm:alice')
+    queue.message('bob', 'Hi', 'text')
+
+    assert queue.pending_keys() == {'role_pm:alice'}
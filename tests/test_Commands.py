@@ -0,0 +1,23 @@
+from games.Commands import Command, find_command, normalize_target, parse_commands
+
+def test_commands_are_found_in_order():
+    commands = parse_commands('I think so.\n!vote u/Bob\nand also !TABLE')
+
+    assert commands == [Command('vote', 'bob'), Command('table', '')]
+
+def test_target_stays_on_the_command_line():
+    assert parse_commands('!vote\nbob') == [Command('vote', '')]
+
+def test_text_glued_to_the_command_is_skipped():
+    assert parse_commands('!target: **/u/carol**') == [Command('target', 'carol')]
+
+def test_target_prefixes_and_punctuation_are_stripped():
+    assert normalize_target('*u/Alice_1,') == 'alice_1'
+    assert normalize_target('/u/bob-2') == 'bob-2'
+    assert normalize_target('carol') == 'carol'
+
+def test_last_command_takes_precedence():
+    commands = parse_commands('!vote alice\n!signup\n!vote bob')
+
+    assert find_command(commands, 'vote') == Command('vote', 'bob')
+    assert find_command(commands, 'kill') is None
@@ -0,0 +1,31 @@
+from games.CommentStream import LISTING_CAP, fetch_new_comments
+
+def post_comments(reddit, post, count):
+    return [reddit.add_comment(post.id, 'alice', 'comment {}'.format(i)) for i in range(count)]
+
+def test_only_comments_after_the_cursor_oldest_first(reddit):
+    subreddit = reddit.subreddit('AutomatedWerewolves')
+    post = subreddit.submit('Phase 1')
+    old = post_comments(reddit, post, 3)
+    other = subreddit.submit('Phase 0')
+    reddit.add_comment(other.id, 'bob', 'elsewhere')
+    new = post_comments(reddit, post, 3)
+
+    assert fetch_new_comments(reddit, subreddit, post.id, old[-1].created_utc) == new
+    assert reddit.calls['submission_fetch'] == 0
+
+def test_short_history_does_not_fall_back(reddit):
+    subreddit = reddit.subreddit('AutomatedWerewolves')
+    post = subreddit.submit('Phase 1')
+    comments = post_comments(reddit, post, 5)
+
+    assert fetch_new_comments(reddit, subreddit, post.id, 0) == comments
+    assert reddit.calls['submission_fetch'] == 0
+
+def test_cursor_past_the_listing_falls_back_to_the_tree(reddit):
+    subreddit = reddit.subreddit('AutomatedWerewolves')
+    post = subreddit.submit('Phase 1')
+    comments = post_comments(reddit, post, LISTING_CAP + 10)
+
+    assert fetch_new_comments(reddit, subreddit, post.id, comments[4].created_utc) == comments[5:]
+    assert reddit.calls['submission_fetch'] == 1
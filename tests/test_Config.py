@@ -0,0 +1,68 @@
+import json
+import time
+import prawcore
+import pytest
+from Config import load_token, prime_authorizer, save_token, user_agent
+
+class FakeReddit:
+    def __init__(self, authorizer):
+        self._core = type('Core', (), {'_authorizer': authorizer})()
+
+class TokenResponse:
+    def json(self):
+        return {'access_token': 'fresh', 'expires_in': 3600, 'scope': 'read submit'}
+
+def make_authorizer(post):
+    authenticator = prawcore.TrustedAuthenticator(requestor=prawcore.Requestor(user_agent=user_agent), client_id='id', client_secret='secret')
+    authenticator._post = post
+    return prawcore.Authorizer(authenticator=authenticator, refresh_token='refresh')
+
+class ConnectionFailed(Exception):
+    pass
+
+def failing_post(**kwargs):
+    raise ConnectionFailed()
+
+def test_saved_token_is_reused(tmp_path):
+    fname = str(tmp_path / 'bot.token.json')
+    authorizer = make_authorizer(lambda **kwargs: TokenResponse())
+    prime_authorizer(FakeReddit(authorizer), fname, 'refresh')
+    authorizer.refresh()
+
+    primed = make_authorizer(failing_post)
+    prime_authorizer(FakeReddit(primed), fname, 'refresh')
+
+    assert primed.access_token == 'fresh'
+    assert primed.is_valid()
+
+def test_saved_token_expiry_is_wall_clock(tmp_path):
+    fname = str(tmp_path / 'bot.token.json')
+    authorizer = make_authorizer(lambda **kwargs: TokenResponse())
+    prime_authorizer(FakeReddit(authorizer), fname, 'refresh')
+    authorizer.refresh()
+
+    with open(fname) as token_file:
+        token = json.load(token_file)
+    assert abs(token['expires_at'] - (time.time() + 3610)) < 5
+
+def test_failed_refresh_leaves_an_expired_token(tmp_path):
+    fname = str(tmp_path / 'bot.token.json')
+    authorizer = make_authorizer(lambda **kwargs: TokenResponse())
+    prime_authorizer(FakeReddit(authorizer), fname, 'refresh')
+    authorizer.refresh()
+
+    primed = make_authorizer(failing_post)
+    prime_authorizer(FakeReddit(primed), fname, 'refresh')
+    with pytest.raises(ConnectionFailed):
+        primed.refresh()
+
+    assert not primed.is_valid()
+
+def test_token_for_another_refresh_token_is_ignored(tmp_path):
+    fname = str(tmp_path / 'bot.token.json')
+    authorizer = make_authorizer(lambda **kwargs: TokenResponse())
+    authorizer.refresh()
+    save_token(fname, authorizer, 'refresh')
+
+    assert load_token(fname, 'other') is None
+    assert load_token(fname, 'refresh')['access_token'] == 'fresh'
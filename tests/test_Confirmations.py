@@ -0,0 +1,117 @@
+from games.ActionQueue import MAX_ATTEMPTS
+from games.Confirmations import CONFIRMED, PENDING, QUEUED, RESEND_HOURS, SENT, TIMEOUT_HOURS, TIMED_OUT, Confirmations, role_pm_key
+
+roles = {'alice': 'Vanilla Town', 'bob': 'Vanilla Town', 'carol': 'Vanilla Wolf'}
+
+def fail_role_pm(game, reddit, player):
+    # Drain until the queue gives up on the player's role PM
+    perform = game.outbound.perform
+    def flaky(reddit, entry):
+        if entry.get('key') == role_pm_key(player):
+            raise Exception('Reddit is down')
+        perform(reddit, entry)
+    game.outbound.perform = flaky
+    for _ in range(MAX_ATTEMPTS):
+        for entry in game.outbound.pending:
+            entry['not_before'] = 0
+        game.outbound.drain(reddit)
+    game.outbound.perform = perform
+
+def test_every_role_pm_is_queued_at_once(make_game):
+    game = make_game(roles, 'confirmation')
+
+    game.handle_confirmations([])
+
+    assert game.outbound.pending_keys() == set(role_pm_key(player) for player in roles)
+    assert all(game.confirmations.status(player) == QUEUED for player in roles)
+
+def test_delivered_role_pms_count_as_sent(make_game, reddit):
+    game = make_game(roles, 'confirmation')
+    game.handle_confirmations([])
+    game.outbound.drain(reddit)
+
+    game.handle_confirmations([])
+
+    assert all(game.confirmations.status(player) == SENT for player in roles)
+    assert len(reddit.sent_messages) == 3
+
+def test_dropped_role_pm_is_queued_again(make_game, reddit):
+    game = make_game(roles, 'confirmation')
+    game.handle_confirmations([])
+    fail_role_pm(game, reddit, 'alice')
+
+    game.handle_confirmations([])
+
+    assert game.confirmations.status('alice') == QUEUED
+    assert [entry['attempts'] for entry in game.outbound.pending if entry.get('key') == role_pm_key('alice')] == [0]
+    assert game.confirmations.status('bob') == SENT
+    assert 'role_pm_sent' not in [event['type'] for event in game.events if event['player'] == 'alice']
+
+def test_dropped_keys_survive_a_reload(make_game, reddit):
+    game = make_game(roles, 'confirmation')
+    game.handle_confirmations([])
+    fail_role_pm(game, reddit, 'alice')
+
+    reloaded = make_game(roles, 'confirmation', game.get_game_data())
+    reloaded.handle_confirmations([])
+
+    assert role_pm_key('alice') in reloaded.outbound.pending_keys()
+    assert reloaded.confirmations.players['alice']['sends'] == 2
+
+def test_confirmation_reply(make_game, reddit):
+    game = make_game(roles, 'confirmation')
+    game.handle_confirmations([])
+    game.outbound.drain(reddit)
+    game.handle_confirmations([])
+
+    game.handle_confirmations([reddit.send_pm('alice', 'confirm')])
+
+    assert game.confirmations.status('alice') == CONFIRMED
+    assert 'alice' in game.confirmed_players
+
+def test_confirmation_before_the_role_pm_is_ignored(make_game, reddit):
+    game = make_game(roles, 'confirmation')
+
+    game.process_inbox([reddit.send_pm('alice', 'confirm')])
+
+    assert game.confirmations.status('alice') == PENDING
+
+def test_unconfirmed_players_are_resent_after_a_while():
+    confirmations = Confirmations()
+    confirmations.queued('alice', 0)
+    confirmations.sent('alice', 0)
+
+    assert confirmations.due(['alice'], RESEND_HOURS * 3600 - 1) == []
+    assert confirmations.due(['alice'], RESEND_HOURS * 3600) == ['alice']
+
+def test_sent_players_time_out():
+    confirmations = Confirmations()
+    confirmations.queued('alice', 0)
+    confirmations.sent('alice', 60)
+
+    assert confirmations.overdue(TIMEOUT_HOURS * 3600) == []
+    assert confirmations.overdue(TIMEOUT_HOURS * 3600 + 60) == ['alice']
+
+def test_players_stuck_in_the_queue_time_out():
+    confirmations = Confirmations()
+    confirmations.queued('alice', 0)
+
+    assert confirmations.overdue(TIMEOUT_HOURS * 3600) == ['alice']
+
+def test_queue_time_is_kept_across_resends():
+    confirmations = Confirmations()
+    confirmations.queued('alice', 0)
+    confirmations.dropped('alice')
+    confirmations.queued('alice', 3600)
+
+    assert confirmations.players['alice']['first_queued'] == 0
+    assert confirmations.overdue(TIMEOUT_HOURS * 3600) == ['alice']
+
+def test_settled():
+    confirmations = Confirmations()
+    confirmations.confirm('alice')
+    confirmations.time_out('bob')
+
+    assert confirmations.settled(['alice', 'bob'])
+    assert not confirmations.settled(['alice', 'bob', 'carol'])
+    assert confirmations.status('bob') == TIMED_OUT
@@ -0,0 +1,87 @@
+import copy
+import pytest
+from games.EventLog import apply, empty_state, replay
+
+roles = {'wolf1': 'Vanilla Wolf', 'wolf2': 'Vanilla Wolf', 'town1': 'Vanilla Town', 'town2': 'Vanilla Town',
+         'town3': 'Vanilla Town', 'town4': 'Vanilla Town', 'town5': 'Vanilla Town'}
+
+# Game data fields the event log keeps track of
+replayed_fields = ['game_phase', 'main_post_id', 'wolf_post_id', 'phase_deadline', 'last_comment_time', 'last_wolf_comment_time',
+                   'live_players', 'dead_players', 'roles', 'confirmations']
+
+def snapshot_of(game):
+    return copy.deepcopy({'game': game.get_game_data(), 'phase': game.get_phase_data()})
+
+def start_phase(make_game, reddit):
+    main_post = reddit.subreddit('AutomatedWerewolves').submit('Phase 1')
+    wolf_post = reddit.subreddit('AutomatedWolfSub').submit('WOLF SUB Phase 1')
+    return make_game(roles, 1, {'main_post_id': main_post.id, 'wolf_post_id': wolf_post.id, 'phase_deadline': 2**40})
+
+def assert_replayed(state, game):
+    game_data = game.get_game_data()
+    for field in replayed_fields:
+        assert state['game'][field] == game_data[field], field
+    assert state['phase'] == game.get_phase_data()
+
+def test_replay_rebuilds_a_phase(make_game, reddit):
+    game = start_phase(make_game, reddit)
+    snapshot = snapshot_of(game)
+    for player in roles:
+        reddit.add_comment(game.main_post_id, player, '!vote u/town1')
+    reddit.add_comment(game.wolf_post_id, 'wolf1', '!kill town2')
+
+    game.handle_main_sub_comments()
+    game.handle_wolf_sub_comments()
+
+    assert_replayed(replay(snapshot, game.pending_events()), game)
+
+def test_replay_rebuilds_a_turnover(make_game, reddit):
+    game = start_phase(make_game, reddit)
+    snapshot = snapshot_of(game)
+    for player in roles:
+        reddit.add_comment(game.main_post_id, player, '!vote u/town1')
+    reddit.add_comment(game.wolf_post_id, 'wolf1', '!kill town2')
+    game.handle_main_sub_comments()
+    game.handle_wolf_sub_comments()
+
+    game.phase_deadline = 0
+    game.handle_turnover()
+
+    state = replay(snapshot, game.pending_events())
+    assert_replayed(state, game)
+    assert state['game']['dead_players'] == ['town1', 'town2']
+    assert state['game']['game_phase'] == 2
+
+def test_replay_rebuilds_signups_and_confirmations(make_game, reddit):
+    game = make_game({'alice': 'Vanilla Town', 'bob': 'Vanilla Town', 'carol': 'Vanilla Wolf'}, 'init', {'live_players': [], 'roles': {}})
+    snapshot = snapshot_of(game)
+    game.init_new_game()
+    for player in ['alice', 'bob', 'carol']:
+        reddit.add_comment(game.main_post_id, player, '!signup')
+    game.handle_signups()
+    game.handle_confirmations([])
+    game.outbound.drain(reddit)
+    game.handle_confirmations([reddit.send_pm('alice', 'confirm')])
+
+    state = replay(snapshot, game.pending_events())
+
+    assert_replayed(state, game)
+    assert state['game']['confirmed_players'] == ['alice']
+
+def test_replay_leaves_the_snapshot_alone():
+    snapshot = empty_state()
+
+    state = replay(snapshot, [{'type': 'signup', 'player': 'alice'}])
+
+    assert state['game']['live_players'] == ['alice']
+    assert snapshot == empty_state()
+
+def test_legacy_role_pm_sent_marks_the_player_dead():
+    state = replay(empty_state(), [{'type': 'signup', 'player': 'alice'}, {'type': 'role_pm_sent', 'player': 'alice'}])
+
+    assert state['game']['live_players'] == []
+    assert state['game']['dead_players'] == ['alice']
+
+def test_unknown_event_type():
+    with pytest.raises(Exception):
+        apply(empty_state(), {'type': 'nonsense'})
@@ -0,0 +1,65 @@
+import json
+import threading
+import pytest
+
+roles = {'alice': 'Vanilla Town', 'bob': 'Vanilla Town', 'carol': 'Vanilla Wolf'}
+
+@pytest.fixture
+def runner(periodical, reddit, make_game, monkeypatch):
+    periodical.session.post(periodical.state_url('new-game', 'g'), {'json': json.dumps({'game_type': 'small'})})
+    games = {'g': make_game(roles, 'finale')}
+    monkeypatch.setattr(periodical.Config, 'Config', lambda name: type('Config', (), {'reddit_object': reddit})())
+    monkeypatch.setattr(periodical, 'load_game', lambda reddit, game_id: games[game_id])
+    return periodical.GameRunner(60, 2, threading.Event())
+
+def test_finished_game_is_let_go(runner):
+    runner.tick_game('g', 0)
+
+    assert runner.games == {}
+
+def test_running_game_is_kept_warm(runner, make_game, periodical, monkeypatch):
+    game = make_game(roles, 'confirmation')
+    monkeypatch.setattr(periodical, 'load_game', lambda reddit, game_id: game)
+
+    runner.tick_game('g', 0)
+
+    assert runner.games['g'][1] is game
+
+def test_failed_tick_drops_the_game(runner, periodical, monkeypatch):
+    def fail(game, game_id=None, messages=None):
+        raise Exception('Tick failed')
+    monkeypatch.setattr(periodical, 'run_tick', fail)
+
+    runner.tick_game('g', 0)
+
+    assert runner.games == {}
+
+def test_failed_tick_routes_its_messages_again(runner, reddit, make_game, periodical, monkeypatch):
+    game = make_game(roles, 'confirmation')
+    monkeypatch.setattr(periodical, 'load_game', lambda reddit, game_id: game)
+    runner.games['g'] = (reddit, game)
+    reddit.send_pm('alice', 'confirm')
+    runner.route_inbox(['g'])
+    def fail(game, game_id=None, messages=None):
+        raise Exception('Tick failed')
+    monkeypatch.setattr(periodical, 'run_tick', fail)
+
+    runner.tick_game('g', 0)
+
+    assert runner.routed == set()
+    runner.games['g'] = (reddit, game)
+    runner.route_inbox(['g'])
+    assert [message.author.name for message in runner.mailboxes['g']] == ['alice']
+
+def test_messages_are_routed_to_the_players_game(runner, reddit, make_game):
+    runner.games['g'] = (reddit, make_game(roles, 'confirmation'))
+    runner.games['h'] = (reddit, make_game({'dave': 'Vanilla Town'}, 'confirmation'))
+    reddit.send_pm('alice', 'confirm')
+    reddit.send_pm('dave', 'confirm')
+    reddit.send_pm('mallory', 'hello')
+
+    runner.route_inbox(['g', 'h'])
+
+    assert [message.author.name for message in runner.mailboxes['g']] == ['alice']
+    assert [message.author.name for message in runner.mailboxes['h']] == ['dave']
+    assert [message.author.name for message in reddit.inbox.unread_messages] == ['alice', 'dave']
@@ -0,0 +1,42 @@
+from games.GameState import TOWN, WOLF, GameState, PlayerSet, alignment_of
+
+roles = {'alice': 'Vanilla Town', 'bob': 'Vanilla Town', 'carol': 'Vanilla Wolf'}
+
+def test_alignment_of():
+    assert alignment_of('Vanilla Wolf') == WOLF
+    assert alignment_of('Vanilla Town') == TOWN
+    assert alignment_of('Jester') is None
+
+def test_player_set_keeps_join_order():
+    players = PlayerSet(['carol', 'alice'])
+    players.add('bob')
+    players.discard('dave')
+
+    assert players.to_list() == ['carol', 'alice', 'bob']
+    assert players.first() == 'carol'
+    assert 'alice' in players
+
+def test_living_counts_follow_deaths():
+    state = GameState(dict(roles), roles)
+
+    state.kill_player('carol')
+
+    assert (state.live_wolves, state.live_town) == (0, 2)
+    assert state.dead_players.to_list() == ['carol']
+
+def test_role_change_moves_the_count():
+    state = GameState(dict(roles), roles)
+
+    state.set_role('bob', 'Vanilla Wolf')
+
+    assert (state.live_wolves, state.live_town) == (2, 1)
+
+def test_game_data_round_trip():
+    state = GameState(dict(roles), roles)
+    state.kill_player('bob')
+    state.confirmed_players.add('alice')
+
+    reloaded = GameState.from_game_data(state.get_game_data())
+
+    assert reloaded.get_game_data() == state.get_game_data()
+    assert (reloaded.live_wolves, reloaded.live_town) == (1, 1)
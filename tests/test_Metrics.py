@@ -0,0 +1,49 @@
+import json
+import pytest
+from games.Metrics import Metrics, registry, timed
+
+def test_take_resets_the_registry():
+    metrics = Metrics()
+    metrics.inc('hww_ticks_total', game='g')
+    metrics.inc('hww_ticks_total', 2, game='g')
+
+    assert metrics.take()['counters'] == [['hww_ticks_total', [('game', 'g')], 3]]
+    assert metrics.take() == {'counters': [], 'gauges': [], 'summaries': []}
+
+def test_merge_accumulates_pushes():
+    bot = Metrics()
+    server = Metrics()
+    for seconds in (1.0, 0.5):
+        bot.inc('hww_ticks_total', game='g')
+        bot.set('hww_live_players', 10 - int(seconds * 2), game='g')
+        bot.observe('hww_tick_seconds', seconds, game='g')
+        # Pushes go through JSON, which turns the label tuples into lists
+        server.merge(json.loads(json.dumps(bot.take())))
+
+    assert server.render() == ('# TYPE hww_live_players gauge\n'
+                               'hww_live_players{game="g"} 9\n'
+                               '# TYPE hww_tick_seconds summary\n'
+                               'hww_tick_seconds_count{game="g"} 2\n'
+                               'hww_tick_seconds_sum{game="g"} 1.5\n'
+                               '# TYPE hww_ticks_total counter\n'
+                               'hww_ticks_total{game="g"} 2\n')
+
+def test_label_values_are_escaped():
+    metrics = Metrics()
+    metrics.inc('hww_errors_total', message='say "hi"\n')
+
+    assert metrics.render() == '# TYPE hww_errors_total counter\nhww_errors_total{message="say \\"hi\\"\\n"} 1\n'
+
+def test_timed_counts_failures():
+    registry.take()
+
+    @timed
+    def handler():
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        handler()
+
+    snapshot = registry.take()
+    assert snapshot['counters'] == [['hww_handler_errors_total', [('handler', 'handler')], 1]]
+    assert snapshot['summaries'][0][:3] == ['hww_handler_seconds', [('handler', 'handler')], 1]
@@ -0,0 +1,92 @@
+from games.GameState import GameState
+from games.Matrix6 import night_roles
+from games.NightActions import SPENT_BULLETPROOF_ROLE, resolve_night
+
+def make_state(roles):
+    return GameState(dict(roles), list(roles))
+
+def messages_to(result, player):
+    return [(subject, text) for to, subject, text in result.messages if to == player]
+
+def test_roleblocker_who_also_kills_still_blocks():
+    state = make_state({'blocker': 'Wolf Roleblocker', 'keeper': 'Town Jailkeeper', 'victim': 'Vanilla Town', 'wolf': 'Vanilla Wolf'})
+    actions = {'blocker': 'keeper', 'keeper': 'victim'}
+
+    result = resolve_night(state, actions, night_roles, 'blocker', 'victim')
+
+    assert result.deaths == ['victim']
+
+def test_roleblocker_who_also_kills_blocks_the_doctor():
+    state = make_state({'blocker': 'Wolf Roleblocker', 'doctor': 'Town Doctor', 'victim': 'Vanilla Town', 'wolf': 'Vanilla Wolf'})
+    actions = {'blocker': 'doctor', 'doctor': 'victim'}
+
+    result = resolve_night(state, actions, night_roles, 'blocker', 'victim')
+
+    assert result.deaths == ['victim']
+
+def test_jailing_the_killer_stops_the_kill():
+    state = make_state({'keeper': 'Town Jailkeeper', 'victim': 'Vanilla Town', 'wolf': 'Vanilla Wolf'})
+
+    result = resolve_night(state, {'keeper': 'wolf'}, night_roles, 'wolf', 'victim')
+
+    assert result.deaths == []
+
+def test_roleblocking_the_killer_does_not_stop_the_kill():
+    state = make_state({'blocker': 'Wolf Roleblocker', 'victim': 'Vanilla Town', 'wolf': 'Vanilla Wolf'})
+
+    result = resolve_night(state, {'blocker': 'wolf'}, night_roles, 'wolf', 'victim')
+
+    assert result.deaths == ['victim']
+
+def test_protection_saves_the_target():
+    state = make_state({'doctor': 'Town Doctor', 'victim': 'Vanilla Town', 'wolf': 'Vanilla Wolf'})
+
+    result = resolve_night(state, {'doctor': 'victim'}, night_roles, 'wolf', 'victim')
+
+    assert result.deaths == []
+
+def test_bulletproof_survives_once():
+    state = make_state({'vest': 'Bulletproof Townie', 'wolf': 'Vanilla Wolf'})
+
+    result = resolve_night(state, {}, night_roles, 'wolf', 'vest')
+
+    assert result.deaths == []
+    assert result.role_changes == {'vest': SPENT_BULLETPROOF_ROLE}
+    assert messages_to(result, 'vest')[0][0] == 'Close Call'
+
+def test_seer_sees_alignment():
+    state = make_state({'seer': 'Town Seer', 'wolf': 'Vanilla Wolf', 'town': 'Vanilla Town'})
+
+    wolf_result = resolve_night(state, {'seer': 'wolf'}, night_roles)
+    town_result = resolve_night(state, {'seer': 'town'}, night_roles)
+
+    assert messages_to(wolf_result, 'seer') == [('Seer Result', 'wolf is a Wolf')]
+    assert messages_to(town_result, 'seer') == [('Seer Result', 'town is Town')]
+
+def test_blocked_seer_fails():
+    state = make_state({'blocker': 'Wolf Roleblocker', 'seer': 'Town Seer', 'wolf': 'Vanilla Wolf'})
+
+    result = resolve_night(state, {'blocker': 'seer', 'seer': 'wolf'}, night_roles)
+
+    assert messages_to(result, 'seer') == [('Action Failed', 'Your action has failed')]
+
+def test_tracker_sees_the_kill_of_a_roleblocker_who_also_kills():
+    state = make_state({'blocker': 'Wolf Roleblocker', 'tracker': 'Town Tracker', 'victim': 'Vanilla Town', 'other': 'Vanilla Town'})
+
+    result = resolve_night(state, {'blocker': 'other', 'tracker': 'blocker'}, night_roles, 'blocker', 'victim')
+
+    assert messages_to(result, 'tracker') == [('Tracker Result', 'blocker\'s Night Action target was victim')]
+
+def test_tracker_sees_no_action():
+    state = make_state({'tracker': 'Town Tracker', 'town': 'Vanilla Town', 'wolf': 'Vanilla Wolf'})
+
+    result = resolve_night(state, {'tracker': 'town'}, night_roles)
+
+    assert messages_to(result, 'tracker') == [('Tracker Result', 'town did not take a Night Action')]
+
+def test_dead_actors_do_nothing():
+    state = GameState({'doctor': 'Town Doctor', 'victim': 'Vanilla Town', 'wolf': 'Vanilla Wolf'}, ['victim', 'wolf'], ['doctor'])
+
+    result = resolve_night(state, {'doctor': 'victim'}, night_roles, 'wolf', 'victim')
+
+    assert result.deaths == ['victim']
@@ -0,0 +1,32 @@
+from games.CommentStream import fetch_comment_tree
+from games.RedditCache import RedditCache, cache_for
+
+def test_handles_are_reused(reddit):
+    post = reddit.subreddit('AutomatedWerewolves').submit('Phase 1')
+    cache = RedditCache(reddit)
+
+    first = cache.submission(post.id)
+    first.created_utc
+
+    assert cache.submission(post.id) is first
+    assert (cache.hits, cache.misses, cache.fetches_avoided) == (1, 1, 1)
+
+def test_least_recently_used_handle_is_evicted(reddit):
+    cache = RedditCache(reddit, capacity=2)
+    alice = cache.redditor('alice')
+    cache.redditor('bob')
+    cache.redditor('Alice')
+
+    cache.redditor('carol')
+
+    assert cache.redditor('alice') is alice
+    assert ('redditor', 'bob') not in cache.handles
+
+def test_comment_tree_handle_is_not_cached(reddit):
+    post = reddit.subreddit('AutomatedWerewolves').submit('Phase 1')
+    cache = cache_for(reddit)
+    cached = cache.submission(post.id)
+    comment = reddit.add_comment(post.id, 'alice', '!vote u/bob')
+
+    assert fetch_comment_tree(reddit, post.id, 0) == [comment]
+    assert list(cache.handles.values()) == [cached]
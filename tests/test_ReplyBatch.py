@@ -0,0 +1,83 @@
+from games.ActionQueue import ActionQueue
+from games.Commands import Command
+from games.ReplyBatch import ReplyBatch
+
+roles = {'alice': 'Vanilla Town', 'bob': 'Vanilla Town', 'carol': 'Vanilla Wolf'}
+
+class Thing:
+    def __init__(self, fullname):
+        self.fullname = fullname
+
+def sent_replies(outbound):
+    return [(entry['params']['thing_id'], entry['params']['text']) for entry in outbound.pending]
+
+def test_one_reply_per_player():
+    replies = ReplyBatch()
+    outbound = ActionQueue()
+    replies.add('alice', Thing('t1_a'), Command('vote', 'bob'), 'vote bob')
+    replies.add('alice', Thing('t1_b'), Command('vote', 'carol'), 'vote carol')
+    replies.add('bob', Thing('t1_c'), Command('vote', 'alice'), 'vote alice')
+
+    assert replies.send(outbound) == 2
+    assert sent_replies(outbound) == [('t1_b', 'vote carol'), ('t1_c', 'vote alice')]
+
+def test_acknowledgements_of_different_commands_are_joined():
+    replies = ReplyBatch()
+    outbound = ActionQueue()
+    replies.add('alice', Thing('t1_a'), Command('vote', 'bob'), 'vote bob')
+    replies.add('alice', Thing('t1_b'), Command('table', ''), None)
+
+    replies.fill('table', lambda: 'the table')
+    replies.send(outbound)
+
+    assert sent_replies(outbound) == [('t1_b', 'vote bob\n\nthe table')]
+
+def test_rejection_does_not_replace_an_accepted_command():
+    replies = ReplyBatch()
+    outbound = ActionQueue()
+    replies.add('alice', Thing('t1_a'), Command('vote', 'bob'), 'vote bob')
+    replies.add('alice', Thing('t1_b'), Command('vote', 'nobody'), 'nobody is not playing', accepted=False)
+
+    replies.send(outbound)
+
+    assert sent_replies(outbound) == [('t1_a', 'vote bob')]
+
+def test_accepted_command_replaces_a_rejection():
+    replies = ReplyBatch()
+    outbound = ActionQueue()
+    replies.add('alice', Thing('t1_a'), Command('vote', 'nobody'), 'nobody is not playing', accepted=False)
+    replies.add('alice', Thing('t1_b'), Command('vote', 'bob'), 'vote bob')
+
+    replies.send(outbound)
+
+    assert sent_replies(outbound) == [('t1_b', 'vote bob')]
+
+def test_fill_is_skipped_without_acknowledgements():
+    replies = ReplyBatch()
+    replies.add('alice', Thing('t1_a'), Command('vote', 'bob'), 'vote bob')
+    calls = []
+
+    replies.fill('table', lambda: calls.append(1))
+
+    assert calls == []
+
+def test_reply_matches_the_vote_that_stands(make_game, reddit):
+    main_post = reddit.subreddit('AutomatedWerewolves').submit('Phase 1')
+    game = make_game(roles, 1, {'main_post_id': main_post.id})
+    valid = reddit.add_comment(main_post.id, 'alice', '!vote u/bob')
+    reddit.add_comment(main_post.id, 'alice', '!vote u/nobody')
+
+    game.handle_main_sub_comments()
+
+    assert game.tally.votes == {'alice': 'bob'}
+    assert sent_replies(game.outbound) == [(valid.fullname, 'Recorded u/alice\'s vote for u/bob for Phase 1')]
+
+def test_reply_matches_the_target_that_stands(make_game, reddit):
+    game = make_game(roles, 1)
+    valid = reddit.send_pm('alice', '!target u/bob')
+    reddit.send_pm('alice', '!target u/nobody')
+
+    game.process_inbox(reddit.inbox.unread_messages)
+
+    assert game.actions == {'alice': 'bob'}
+    assert sent_replies(game.outbound) == [(valid.fullname, 'You have targeted u/bob for Phase 1')]
@@ -0,0 +1,67 @@
+import pytest
+from StateStore import StateStore
+
+@pytest.fixture
+def store(tmp_path):
+    return StateStore(str(tmp_path / 'state.db'))
+
+def test_patch_only_touches_given_fields(store):
+    store.replace('g/game', {'a': 1, 'b': [1, 2]})
+
+    store.patch('g/game', {'b': [3]})
+
+    assert store.get('g/game') == {'a': 1, 'b': [3]}
+
+def test_every_write_bumps_the_version(store):
+    assert store.version('g/game') == (0, 0)
+
+    first = store.replace('g/game', {'a': 1})
+    second = store.patch('g/game', {'a': 2})
+
+    assert (first, second) == (1, 2)
+    assert store.version('g/game')[0] == 2
+
+def test_write_with_events_appends_to_the_log(store):
+    versions, seq = store.write_with_events([('g/game', {'a': 1}, True), ('g/phase', {'votes': {}}, True)], 'g', [{'type': 'signup', 'player': 'alice'}])
+
+    assert versions == [1, 1]
+    assert seq == 1
+    assert store.events_since('g', 0) == [(1, {'type': 'signup', 'player': 'alice'})]
+
+def test_write_with_events_is_atomic(store):
+    store.replace('g/game', {'a': 1})
+
+    with pytest.raises(TypeError):
+        # Events that can't be stored roll back the document writes too
+        store.write_with_events([('g/game', {'a': 2}, False)], 'g', [{'type': 'signup', 'player': {'not', 'json'}}])
+
+    assert store.get('g/game') == {'a': 1}
+    assert store.version('g/game')[0] == 1
+    assert store.events_since('g', 0) == []
+
+def test_events_are_numbered_per_game(store):
+    store.append_events('g', [{'type': 'signup', 'player': 'alice'}, {'type': 'signup', 'player': 'bob'}])
+    seq = store.append_events('g', [{'type': 'signup', 'player': 'carol'}])
+    other = store.append_events('h', [{'type': 'signup', 'player': 'dave'}])
+
+    assert (seq, other) == (3, 1)
+    assert [event['player'] for _, event in store.events_since('g', 1)] == ['bob', 'carol']
+
+def test_only_the_newest_snapshots_are_kept(store):
+    for seq in range(5):
+        store.save_snapshot('g', seq, {'seq': seq}, keep=2)
+
+    assert store.latest_snapshot('g') == (4, {'seq': 4})
+    assert store.connection().execute('SELECT COUNT(*) FROM snapshots').fetchone()[0] == 2
+
+def test_nested_transactions_commit_together(store):
+    store.replace('g/game', {'a': 1})
+
+    with pytest.raises(ValueError):
+        with store.transaction():
+            store.replace('g/game', {'a': 2})
+            store.append_events('g', [{'type': 'signup', 'player': 'alice'}])
+            raise ValueError()
+
+    assert store.get('g/game') == {'a': 1}
+    assert store.events_since('g', 0) == []
@@ -0,0 +1,49 @@
+from games.VoteTally import VoteTally
+
+def test_votes_are_counted():
+    tally = VoteTally({'alice': 'carol', 'bob': 'carol', 'carol': 'alice'})
+
+    assert len(tally) == 3
+    assert tally.count('carol') == 2
+    assert tally.sorted_votes() == [('carol', 2), ('alice', 1)]
+    assert tally.leaders() == ['carol']
+
+def test_changing_a_vote_moves_it():
+    tally = VoteTally({'alice': 'carol', 'bob': 'carol'})
+
+    tally.vote('bob', 'alice')
+
+    assert tally.sorted_votes() == [('carol', 1), ('alice', 1)]
+    assert tally.leaders() == ['carol', 'alice']
+    assert tally.voters == {'carol': {'alice': None}, 'alice': {'bob': None}}
+
+def test_last_vote_for_a_target_removes_it():
+    tally = VoteTally({'alice': 'carol'})
+
+    tally.vote('alice', 'bob')
+
+    assert 'carol' not in tally.voters
+    assert tally.buckets == {1: {'bob': None}}
+
+def test_repeated_vote_is_a_no_op():
+    tally = VoteTally({'alice': 'carol'})
+    table = tally.table()
+
+    tally.vote('alice', 'carol')
+
+    assert tally.count('carol') == 1
+    assert tally.table() is table
+
+def test_table_is_rebuilt_after_a_vote():
+    tally = VoteTally({'alice': 'carol', 'bob': 'carol'})
+    tally.table()
+
+    tally.vote('carol', 'alice')
+
+    assert tally.table() == 'Player | Votes Against | Voters\n:- | :- | :-\ncarol | 2 | alice bob \nalice | 1 | carol \n'
+
+def test_empty_tally():
+    tally = VoteTally()
+
+    assert tally.leaders() == []
+    assert tally.sorted_votes() == []
@@ -0,0 +1,120 @@
+import json
+import pytest
+
+@pytest.fixture
+def client(server):
+    client = server.app.test_client()
+    client.post('/games/g/new-game/', data={'json': json.dumps({'game_type': 'small'})})
+    return client
+
+def post_json(client, path, data, headers=None):
+    return client.post(path, data={'json': json.dumps(data)}, headers=headers or {})
+
+signup = {'type': 'signup', 'player': 'alice'}
+
+def test_tick_state_post_appends_its_events(client):
+    response = post_json(client, '/games/g/tick-state/', {'game': {'live_players': ['alice']}, 'events': [signup]})
+
+    assert response.status_code == 200
+    assert response.get_json()['seq'] == 1
+    assert client.get('/games/g/events/').get_json() == [{'seq': 1, 'event': signup}]
+
+def test_tick_state_post_without_events(client):
+    response = post_json(client, '/games/g/tick-state/', {'game': {'live_players': []}})
+
+    assert response.get_json()['seq'] is None
+    assert client.get('/games/g/events/').get_json() == []
+
+def test_recover_replays_the_tick_events(client):
+    post_json(client, '/games/g/tick-state/', {'game': {'live_players': ['alice']}, 'events': [signup]})
+    post_json(client, '/games/g/game-data/', {'game_type': 'small', 'live_players': ['mallory']})
+
+    recovered = client.post('/games/g/recover/').get_json()
+
+    assert recovered['game']['live_players'] == ['alice']
+    assert client.get('/games/g/game-data/').get_json()['live_players'] == ['alice']
+
+def test_snapshot_is_taken_every_interval(server, client):
+    events = [{'type': 'signup', 'player': 'player{}'.format(i)} for i in range(server.snapshot_interval)]
+
+    post_json(client, '/games/g/tick-state/', {'game': {}, 'events': events})
+
+    seq, state = server.store.latest_snapshot('g')
+    assert seq == server.snapshot_interval
+    assert len(state['game']['live_players']) == server.snapshot_interval
+
+def test_new_game_clears_the_log(client):
+    post_json(client, '/games/g/events/', [signup])
+
+    client.post('/games/g/new-game/', data={'json': json.dumps({'game_type': 'small'})})
+
+    assert client.get('/games/g/events/').get_json() == []
+
+def test_patch_with_a_current_etag(client):
+    etag = client.get('/games/g/game-data/').headers['ETag']
+
+    response = client.patch('/games/g/game-data/', data={'json': json.dumps({'live_players': ['alice']})}, headers={'If-Match': etag})
+
+    assert response.status_code == 200
+    assert client.get('/games/g/game-data/').get_json()['live_players'] == ['alice']
+
+def test_patch_with_a_stale_etag_is_rejected(client):
+    etag = client.get('/games/g/game-data/').headers['ETag']
+    client.post('/games/g/new-game/', data={'json': json.dumps({'game_type': 'small'})})
+
+    response = client.patch('/games/g/game-data/', data={'json': json.dumps({'live_players': ['alice']})}, headers={'If-Match': etag})
+
+    assert response.status_code == 412
+    assert 'live_players' not in client.get('/games/g/game-data/').get_json()
+
+def test_tick_state_post_with_a_stale_etag_writes_nothing(client):
+    etags = client.get('/games/g/tick-state/').get_json()['etags']
+    post_json(client, '/games/g/phase-data/', {'votes': {'bob': 'carol'}})
+
+    response = post_json(client, '/games/g/tick-state/', {'game': {'live_players': ['alice']}, 'phase': {'votes': {'alice': 'bob'}}, 'events': [signup]},
+        {'If-Match': ', '.join(etags.values())})
+
+    assert response.status_code == 412
+    assert 'live_players' not in client.get('/games/g/game-data/').get_json()
+    assert client.get('/games/g/events/').get_json() == []
+
+def test_tick_state_post_only_checks_the_documents_it_names(client):
+    etags = client.get('/games/g/tick-state/').get_json()['etags']
+    post_json(client, '/games/g/phase-data/', {'votes': {'bob': 'carol'}})
+
+    response = post_json(client, '/games/g/tick-state/', {'game': {'live_players': ['alice']}}, {'If-Match': etags['game']})
+
+    assert response.status_code == 200
+
+def test_writes_answer_with_the_etag_only(client):
+    response = client.patch('/games/g/game-data/', data={'json': json.dumps({'live_players': ['alice']})})
+
+    assert response.get_json() == {'etag': response.headers['ETag']}
+    assert client.get('/games/g/game-data/', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+def test_write_in_the_same_second_is_not_hidden_by_if_modified_since(client):
+    client.patch('/games/g/game-data/', data={'json': json.dumps({'live_players': ['alice']})})
+    last_modified = client.get('/games/g/game-data/').headers['Last-Modified']
+
+    client.patch('/games/g/game-data/', data={'json': json.dumps({'live_players': ['bob']})})
+    response = client.get('/games/g/game-data/', headers={'If-Modified-Since': last_modified})
+
+    assert response.status_code == 200
+    assert response.get_json()['live_players'] == ['bob']
+
+def test_if_modified_since_after_the_last_write(client):
+    response = client.get('/games/g/game-data/', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+
+    assert response.status_code == 304
+
+def test_failed_reset_writes_nothing(server, client, monkeypatch):
+    post_json(client, '/games/g/tick-state/', {'game': {'live_players': ['alice']}, 'events': [signup]})
+    def fail(*args, **kwargs):
+        raise IOError('disk full')
+    monkeypatch.setattr(server.store, 'save_snapshot', fail)
+
+    response = client.post('/games/g/new-game/', data={'json': json.dumps({'game_type': 'small'})})
+
+    assert response.status_code == 500
+    assert client.get('/games/g/game-data/').get_json()['live_players'] == ['alice']
+    assert client.get('/games/g/events/').get_json() == [{'seq': 1, 'event': signup}]
@@ -0,0 +1,95 @@
+import json
+import os
+import pytest
+
+roles = {'alice': 'Vanilla Town', 'bob': 'Vanilla Town', 'carol': 'Vanilla Wolf'}
+
+@pytest.fixture
+def game(periodical, make_game):
+    periodical.session.post(periodical.state_url('new-game', 'g'), {'json': json.dumps({'game_type': 'small'})})
+    return make_game(roles, 'confirmation')
+
+def test_save_game_sends_events_with_the_documents(periodical, game):
+    game.handle_confirmations([])
+    events = list(game.events)
+
+    periodical.save_game(game, 'g', with_phase=False)
+
+    assert game.events == []
+    assert [request for request in periodical.session.requests if request[1] == '/games/g/events/'] == []
+    logged = periodical.session.get(periodical.state_url('events', 'g')).json()
+    assert [entry['event'] for entry in logged] == events
+
+def test_failed_save_keeps_the_events(periodical, game, monkeypatch):
+    game.handle_confirmations([])
+    events = list(game.events)
+    def fail(*args, **kwargs):
+        raise ConnectionError('state server is down')
+    monkeypatch.setattr(periodical.session, 'post', fail)
+
+    with pytest.raises(ConnectionError):
+        periodical.save_game(game, 'g', with_phase=False)
+
+    assert game.events == events
+
+def test_save_after_a_server_reset_is_rejected(periodical, game):
+    periodical.save_game(game, 'g', with_phase=False)
+    periodical.get_tick_state('g')
+    periodical.session.post(periodical.state_url('new-game', 'g'), {'json': json.dumps({'game_type': 'small', 'main_sub_name': 'Fresh'})})
+    game.handle_confirmations([])
+
+    with pytest.raises(periodical.StateConflict):
+        periodical.save_game(game, 'g', with_phase=False)
+
+    game_data, phase_data = periodical.get_tick_state('g')
+    assert game_data == {'game_type': 'small', 'main_sub_name': 'Fresh'}
+
+def test_patch_after_a_server_reset_is_rejected(periodical, game):
+    periodical.update_game_data(game.get_game_data(), 'g')
+    periodical.session.post(periodical.state_url('new-game', 'g'), {'json': json.dumps({'game_type': 'small'})})
+    game.main_post_id = 'abc'
+
+    with pytest.raises(periodical.StateConflict):
+        periodical.update_game_data(game.get_game_data(), 'g')
+
+    assert periodical.get_game_data('g') == {'game_type': 'small'}
+
+def test_state_cache_is_private_and_reloadable(periodical, game):
+    periodical.save_game(game, 'g', with_phase=False)
+
+    assert oct(os.stat(periodical.cache_fname).st_mode & 0o777) == '0o600'
+    assert not os.path.exists(periodical.cache_fname + '.tmp')
+    known = dict(periodical.known_state)
+    periodical.known_state.clear()
+    periodical.load_cache()
+    assert periodical.known_state == known
+
+def test_state_cache_is_only_rewritten_on_change(periodical, game, monkeypatch):
+    periodical.save_game(game, 'g', with_phase=False)
+    periodical.get_tick_state('g')
+    saves = []
+    monkeypatch.setattr(periodical, 'save_cache', lambda: saves.append(1))
+
+    periodical.get_tick_state('g')
+    periodical.save_game(game, 'g', with_phase=False)
+
+    assert saves == []
+
+def test_inbox_is_marked_read_after_the_save(periodical, game, reddit):
+    reddit.send_pm('alice', 'confirm')
+
+    periodical.run_tick(game, 'g')
+
+    assert reddit.inbox.unread_messages == []
+    assert game.read_messages == []
+
+def test_failed_save_leaves_the_inbox_unread(periodical, game, reddit, monkeypatch):
+    message = reddit.send_pm('alice', 'confirm')
+    def fail(*args, **kwargs):
+        raise periodical.StateConflict('game-data')
+    monkeypatch.setattr(periodical, 'save_game', fail)
+
+    with pytest.raises(periodical.StateConflict):
+        periodical.run_tick(game, 'g')
+
+    assert reddit.inbox.unread_messages == [message]